@@ -0,0 +1,179 @@
+"""
+Computes the stats of every game in a tf2 log file without the gui.  The
+games are analysed in parallel and the results are written to csv files or
+a sqlite database as they finish.
+
+    python batch_analyzer.py logs.txt --csv stats
+    python batch_analyzer.py logs.txt --sqlite stats.db
+"""
+
+import argparse
+import csv
+import os
+import sqlite3
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from log_parsing import GameState, damage_types
+from log_reader import iter_game_ranges, read_range
+from weapons import load_weapons
+
+GameRow = NamedTuple("GameRow", [("game", int),
+                                 ("map", str),
+                                 ("start", int),
+                                 ("end", int),
+                                 ("lines", int),
+                                 ("kills", int)])
+
+player_columns = ["game", "player", "kills", "deaths", "elo", "best_streak",
+                  "points"] + list(damage_types)
+
+# (log path, game number, start offset, end offset)
+GameTask = Tuple[str, int, int, int]
+
+_weapon_class: Dict[str, str] = {}
+_weapon_dmg: Dict[str, str] = {}
+
+
+def _init_worker(weapon_class: Dict[str, str], weapon_dmg: Dict[str, str]) -> None:
+    global _weapon_class, _weapon_dmg  #pylint: disable=global-statement
+    _weapon_class = weapon_class
+    _weapon_dmg = weapon_dmg
+
+
+def analyze_game(task: GameTask) -> Tuple[GameRow, List[tuple]]:
+    """
+    computes the game stats and the stats of each player for one game of
+    the log
+    """
+    path, game, start, end = task
+    lines = read_range(path, start, end)
+    state = GameState("", _weapon_class, _weapon_dmg)
+    game_map = ""
+    for line in lines:
+        if not game_map and line.startswith("Map:"):
+            game_map = line[4:].strip()
+        state.process_line(line)
+    # the players that left are archived by the state, but they played in
+    # the game too
+    for player in list(state.departed):
+        state.rejoin(player)
+
+    players = set(state.player_kills) | set(state.player_deaths) | set(state.points)
+    player_rows = []
+    for p in sorted(players):
+        dmg_kills = state.player_dmg_kills.get(p, {})
+        player_rows.append((game, p, state.player_kills.get(p, 0),
+                            state.player_deaths.get(p, 0),
+                            round(state.player_elo.get(p, 1600.0), 1),
+                            max(state.killstreaks.get(p, [0])),
+                            state.points.get(p, 0))
+                           + tuple(dmg_kills.get(dt, 0) for dt in damage_types))
+    game_row = GameRow(game, game_map, start, end, len(lines), len(state.kill_events))
+    return (game_row, player_rows)
+
+
+def game_tasks(path: str) -> Iterator[GameTask]:
+    """
+    yields a task for each game in the log
+    """
+    for game, (start, end) in enumerate(iter_game_ranges(path)):
+        yield (path, game, start, end)
+
+
+def analyze_log(path: str, weapon_class: Dict[str, str], weapon_dmg: Dict[str, str],
+                jobs: Optional[int] = None) -> Iterator[Tuple[GameRow, List[tuple]]]:
+    """
+    yields the stats of each game of the log in order.  The games are
+    analysed by a pool of `jobs` processes, or in this process if jobs is 1.
+    """
+    if jobs == 1:
+        _init_worker(weapon_class, weapon_dmg)
+        yield from map(analyze_game, game_tasks(path))
+        return
+    with Pool(jobs, initializer=_init_worker, initargs=(weapon_class, weapon_dmg)) as pool:
+        yield from pool.imap(analyze_game, game_tasks(path))
+
+
+class CsvWriter:
+    """
+    writes the game stats to {prefix}_games.csv and the player stats to
+    {prefix}_players.csv
+    """
+
+    def __init__(self, prefix: str):
+        self._games_file = open(f"{prefix}_games.csv", "w", newline="", encoding="utf-8")
+        self._players_file = open(f"{prefix}_players.csv", "w", newline="", encoding="utf-8")
+        self._games = csv.writer(self._games_file)
+        self._players = csv.writer(self._players_file)
+        self._games.writerow(GameRow._fields)
+        self._players.writerow(player_columns)
+
+    def write(self, game_row: GameRow, player_rows: Iterable[tuple]) -> None:
+        self._games.writerow(game_row)
+        self._players.writerows(player_rows)
+
+    def close(self) -> None:
+        self._games_file.close()
+        self._players_file.close()
+
+
+class SqliteWriter:
+    """
+    writes the game stats to the game table and the player stats to the
+    player_stats table of a sqlite database, committing every
+    `batch_size` games
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 100):
+        self.conn = sqlite3.connect(db_path)
+        self.batch_size = batch_size
+        self._pending = 0
+        game_cols = ", ".join(GameRow._fields)
+        player_cols = ", ".join(player_columns)
+        self.conn.execute(f"create table if not exists game ({game_cols})")
+        self.conn.execute(f"create table if not exists player_stats ({player_cols})")
+        self._game_insert = f"insert into game values ({', '.join('?' * len(GameRow._fields))})"
+        self._player_insert = f"insert into player_stats values ({', '.join('?' * len(player_columns))})"
+
+    def write(self, game_row: GameRow, player_rows: Iterable[tuple]) -> None:
+        self.conn.execute(self._game_insert, game_row)
+        self.conn.executemany(self._player_insert, player_rows)
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.conn.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log", help="path to logs.txt")
+    parser.add_argument("--weapons", default="tf2_weapons.db",
+                        help="weapon database (default: tf2_weapons.db)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: all cores)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--csv", metavar="PREFIX",
+                        help="write PREFIX_games.csv and PREFIX_players.csv")
+    output.add_argument("--sqlite", metavar="DB", help="write to a sqlite database")
+    args = parser.parse_args(argv)
+
+    weapon_class, weapon_dmg = load_weapons(args.weapons)
+    writer = CsvWriter(args.csv) if args.csv else SqliteWriter(args.sqlite)
+    games = 0
+    try:
+        for game_row, player_rows in analyze_log(args.log, weapon_class, weapon_dmg,
+                                                 args.jobs):
+            writer.write(game_row, player_rows)
+            games += 1
+    finally:
+        writer.close()
+    print(f"analysed {games} games")
+
+
+if __name__ == "__main__":
+    main()
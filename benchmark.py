@@ -0,0 +1,147 @@
+"""
+Times the parsing and stats hot paths on synthetic logs of several sizes and
+the startup imports, and compares the results with a saved baseline and the
+startup budgets.
+
+    python benchmark.py                 compares with benchmark_baseline.json
+    python benchmark.py --save          saves the results as the new baseline
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from dashboard_model import build_snapshot
+from log_parsing import (GameState, NameIndex, explained_points, get_teams,
+                         parse_kill_line, parse_objective_line, read_connections)
+from log_reader import read_latest_game
+from synthetic_logs import LogOptions, log_options, write_log
+from weapons import load_weapons
+
+scales: Dict[str, LogOptions] = {
+    "small": log_options(players=24, kills_per_game=1_000),
+    "medium": log_options(players=32, kills_per_game=10_000, ambiguous_names=4),
+    "large": log_options(players=100, kills_per_game=100_000, ambiguous_names=10,
+                         objectives_per_game=500, team_switches=20),
+}
+
+# the modules imported at startup, and the most seconds importing them may
+# take on top of starting the interpreter
+startup_imports = {
+    "headless": "import log_parsing, log_reader, dashboard_model, batch_analyzer",
+    "gui": "import tf2_dashboard",
+}
+startup_budgets = {"headless": 0.3, "gui": 0.5}
+
+
+def best_time(f: Callable[[], object], repeat: int) -> float:
+    """
+    returns the fastest of `repeat` runs of f in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_scale(options: LogOptions, repeat: int = 3) -> Dict[str, float]:
+    """
+    times each hot path on a log generated with the options
+    """
+    weapon_class, weapon_dmg = load_weapons("tf2_weapons.db")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "logs.txt")
+        write_log(path, options)
+        lines = read_latest_game(path) or []
+        names = NameIndex(read_connections(lines))
+        kill_events = [ke for ke in (parse_kill_line(l, names) for l in lines) if ke]
+
+        def render_pipeline():
+            state = GameState("player0", weapon_class, weapon_dmg)
+            state.process_lines(read_latest_game(path) or [])
+            return build_snapshot(state)
+
+        return {
+            "read_latest_game": best_time(lambda: read_latest_game(path), repeat),
+            "parse_kill_line": best_time(
+                lambda: [parse_kill_line(l, names) for l in lines], repeat),
+            "parse_objective_line": best_time(
+                lambda: [parse_objective_line(l, names) for l in lines], repeat),
+            "get_teams": best_time(lambda: get_teams("player0", kill_events), repeat),
+            "explained_points": best_time(lambda: explained_points(lines, names), repeat),
+            "render_pipeline": best_time(render_pipeline, repeat),
+        }
+
+
+def startup_times(repeat: int = 3) -> Dict[str, float]:
+    """
+    times importing the headless and gui modules in a fresh interpreter
+    """
+    def run(code: str) -> float:
+        return best_time(lambda: subprocess.run([sys.executable, "-c", code], check=True),
+                         repeat)
+
+    interpreter = run("pass")
+    return {name: max(0.0, run(code) - interpreter) for name, code in startup_imports.items()}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """
+    prints the results next to the baseline and returns the timings that
+    are slower than the baseline by more than the threshold ratio
+    """
+    regressions = []
+    for scale, timings in results.items():
+        for name, seconds in timings.items():
+            base = baseline.get(scale, {}).get(name)
+            ratio = f"{seconds / base:6.2f}x" if base else "      "
+            print(f"{scale:>8} {name:<22} {seconds * 1000:10.2f} ms {ratio}")
+            if base and seconds / base > threshold:
+                regressions.append(f"{scale} {name}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", nargs="+", choices=sorted(scales),
+                        default=["small", "medium"], help="log sizes to run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing")
+    parser.add_argument("--baseline", default="benchmark_baseline.json",
+                        help="baseline results file")
+    parser.add_argument("--save", action="store_true",
+                        help="save the results to the baseline file")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = {scale: run_scale(scales[scale], args.repeat) for scale in args.scales}
+    results["startup"] = startup_times(args.repeat)
+    baseline: Dict[str, Dict[str, float]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+    regressions.extend(f"startup {name} over its {budget * 1000:.0f} ms budget"
+                       for name, budget in startup_budgets.items()
+                       if results["startup"][name] > budget)
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+    if regressions:
+        print("regressions:", ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
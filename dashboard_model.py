@@ -0,0 +1,307 @@
+"""
+Computes everything the dashboard shows in a worker thread.  The gui only
+applies the snapshots the worker produces, so reading and parsing the log
+never blocks the tkinter event loop.
+"""
+
+import queue
+import threading
+import traceback
+from statistics import mean
+from typing import Callable, Dict, NamedTuple, Optional, Set, Tuple
+
+from event_cache import EventCache
+from log_parsing import GameStartEvent, GameState, sort_descending
+from log_reader import GameIndex, LogFollower, latest_game_offset
+from rating_store import RatingStore
+from roster_poller import RosterPoller
+from tick_profiler import TickProfiler
+
+PlayerRow = NamedTuple("PlayerRow", [("name", str),
+                                     ("elo", float),
+                                     ("tf2_class", str)])
+
+RivalRow = NamedTuple("RivalRow", [("name", str),
+                                   ("kills", int),
+                                   ("elo", float),
+                                   ("tf2_class", str)])
+
+# the kill types are (damage type, kills) pairs so the snapshot is immutable
+Snapshot = NamedTuple("Snapshot", [("user", str),
+                                   ("game_id", int),
+                                   ("kills", int),
+                                   ("deaths", int),
+                                   ("kd", float),
+                                   ("streak", int),
+                                   ("elo", float),
+                                   ("allies", Tuple[PlayerRow, ...]),
+                                   ("enemies", Tuple[PlayerRow, ...]),
+                                   ("ally_elo", int),
+                                   ("enemy_elo", int),
+                                   ("ally_kills", int),
+                                   ("enemy_kills", int),
+                                   ("ally_killtypes", Tuple[Tuple[str, int], ...]),
+                                   ("enemy_killtypes", Tuple[Tuple[str, int], ...]),
+                                   ("rivals", Tuple[RivalRow, ...]),
+                                   ("killstreak_history", Tuple[int, ...]),
+                                   ("elo_history", Tuple[float, ...]),
+                                   ("kills_per_minute", float),
+                                   ("deaths_per_minute", float),
+                                   ("recent_kd", float),
+                                   ("ally_recent_kd", float),
+                                   ("enemy_recent_kd", float)])
+
+
+def build_snapshot(state: GameState,
+                   teams: Optional[Tuple[Set[str], Set[str]]] = None) -> Snapshot:
+    """
+    builds the dashboard snapshot from the current game state.  The teams of
+    the user are inferred from the kills unless they are given.
+    """
+    user = state.user
+    player_elo = state.player_elo
+    player_class = state.player_class
+
+    # the log does not contain disconnection events. This is a workaround
+    # to only include players who are actively doing something.
+    metrics = state.metrics
+    active_players = metrics.active_players()
+
+    allies, enemies = teams if teams is not None else state.team_tracker.teams(user)
+    allies = {a for a in allies if a in active_players}
+    enemies = {a for a in enemies if a in active_players}
+
+    if allies and enemies:
+        ally_elo = int(mean(player_elo[a] for a in allies))
+        enemy_elo = int(mean(player_elo[a] for a in enemies))
+    else:
+        ally_elo = 1600
+        enemy_elo = 1600
+
+    def player_rows(players):
+        return tuple(PlayerRow(name, elo, tf2_class) for elo, name, tf2_class in
+                     sorted([(player_elo[p], p, player_class.get(p, "many"))
+                             for p in players], reverse=True))
+
+    def rival_elo(name):
+        # rivals that left keep the elo they had, and the others start at
+        # their career elo like every player
+        archive = state.departed.get(name)
+        if archive is not None and "player_elo" in archive:
+            return archive["player_elo"]
+        return player_elo[name]
+
+    def rival_class(name):
+        archive = state.departed.get(name)
+        if archive is not None and "player_class" in archive:
+            return archive["player_class"]
+        return player_class.get(name, "many")
+
+    rivals = tuple(RivalRow(name, kills, rival_elo(name), rival_class(name))
+                   for kills, name in sort_descending(state.rivals))
+
+    kills = state.kills
+    deaths = state.deaths
+    return Snapshot(user=user,
+                    game_id=state.game_id,
+                    kills=kills,
+                    deaths=deaths,
+                    kd=round(kills / deaths if deaths else 0, 2),
+                    streak=state.killstreak(),
+                    elo=player_elo[user],
+                    allies=player_rows(allies),
+                    enemies=player_rows(enemies),
+                    ally_elo=ally_elo,
+                    enemy_elo=enemy_elo,
+                    ally_kills=state.team_kills(allies),
+                    enemy_kills=state.team_kills(enemies),
+                    ally_killtypes=tuple(state.team_killtypes(allies).items()),
+                    enemy_killtypes=tuple(state.team_killtypes(enemies).items()),
+                    rivals=rivals,
+                    killstreak_history=tuple(state.killstreaks.get(user, [0])[-8:]),
+                    elo_history=tuple(state.elo_history[-50:]),
+                    kills_per_minute=round(metrics.kills_per_minute([user]), 1),
+                    deaths_per_minute=round(metrics.deaths_per_minute([user]), 1),
+                    recent_kd=round(metrics.kd([user]), 2),
+                    ally_recent_kd=round(metrics.kd(allies), 2),
+                    enemy_recent_kd=round(metrics.kd(enemies), 2))
+
+
+def indexed_game_offset(log_path: str) -> int:
+    """
+    returns the offset of the latest game from the game index of the log
+    """
+    index = GameIndex(log_path)
+    index.update()
+    if index.offsets:
+        return index.offsets[-1]
+    return latest_game_offset(log_path) or 0
+
+
+class ComputeWorker(threading.Thread):
+    """
+    Follows the log and rebuilds the snapshot every `interval` seconds.  A
+    snapshot is only published when it differs from the previous one, and
+    the queue holds only the newest snapshot so a slow consumer never
+    applies stale ones.
+    """
+
+    def __init__(self, log_path: str, user_path: str,
+                 weapon_class: Dict[str, str], weapon_dmg: Dict[str, str],
+                 interval: float = 0.5,
+                 roster_poller: Optional[RosterPoller] = None,
+                 ratings: Optional[RatingStore] = None,
+                 profiler: Optional[TickProfiler] = None,
+                 on_snapshot: Optional[Callable[[Snapshot], None]] = None,
+                 event_cache: Optional[EventCache] = None):
+        super().__init__(daemon=True)
+        self.log_path = log_path
+        self.user_path = user_path
+        self.weapon_class = weapon_class
+        self.weapon_dmg = weapon_dmg
+        self.interval = interval
+        self.roster_poller = roster_poller if roster_poller else RosterPoller()
+        self.ratings = ratings
+        self.profiler = profiler if profiler else TickProfiler("worker", enabled=False)
+        # called in the worker thread with every new snapshot, so it must not
+        # block
+        self.on_snapshot = on_snapshot
+        self.event_cache = event_cache
+        self.snapshots: "queue.Queue[Snapshot]" = queue.Queue(maxsize=1)
+        self.follower: Optional[LogFollower] = None
+        self.game_state: Optional[GameState] = None
+        self._last: Optional[Snapshot] = None
+        # the last error printed by run
+        self._last_error: Optional[str] = None
+        self._stop_event = threading.Event()
+
+    def read_user(self) -> str:
+        """
+        reads the username of the player from the user file
+        """
+        with open(self.user_path, encoding="utf-8") as f:
+            return f.read().strip()
+
+    def latest_game_offset(self) -> int:
+        return indexed_game_offset(self.log_path)
+
+    def tick(self) -> Snapshot:
+        """
+        reads the new lines of the log and returns the updated snapshot
+        """
+        profiler = self.profiler
+        user = self.read_user()
+        if self.follower is None or self.game_state is None or self.game_state.user != user:
+            # the stats depend on the user, so the latest game is read from
+            # its start
+            self.game_state = GameState(user, self.weapon_class, self.weapon_dmg,
+                                        self.ratings)
+            # the game so far is applied in this tick, so its events stay out
+            # of the time window of the live metrics
+            self.game_state.catch_up()
+            offset = self.latest_game_offset()
+            if self.event_cache:
+                # the events cached by the last run are applied instead of
+                # parsing the game again
+                offset = self.event_cache.restore(self.log_path, offset, self.game_state)
+            self.follower = LogFollower(self.log_path, offset)
+
+        with profiler.stage("read"):
+            rotations = self.follower.rotations
+            start = self.follower.line_offset
+            new_lines = self.follower.read_lines()
+        with profiler.stage("parse"):
+            state = self.game_state
+            if self.follower.rotations != rotations:
+                state.new_game()
+                start = 0
+            events = []
+            for line in new_lines:
+                event = state.process_line(line)
+                if event is not None:
+                    events.append((state.line_number, event))
+            state.caught_up()
+        if self.event_cache and new_lines:
+            with profiler.stage("cache"):
+                # a new game starts the cached range again at the offset a
+                # restart reads the game from
+                game_start = None
+                if any(isinstance(event, GameStartEvent) for _, event in events):
+                    game_start = self.latest_game_offset()
+                self.event_cache.append(self.log_path, start, self.follower.line_offset,
+                                        state.line_number, events, self.follower.tail,
+                                        game_start)
+
+        # the server roster helps to split kill lines with ambiguous names.
+        # It is queried in the background and the cached roster is used
+        # meanwhile
+        with profiler.stage("a2s"):
+            server = self.game_state.server
+            if server:
+                self.roster_poller.request(server)
+                self.game_state.update_roster(self.roster_poller.roster(server))
+
+        with profiler.stage("teams"):
+            teams = self.game_state.team_tracker.teams(user)
+        with profiler.stage("snapshot"):
+            return build_snapshot(self.game_state, teams)
+
+    def publish(self, snapshot: Snapshot) -> None:
+        """
+        replaces the queued snapshot with the given one
+        """
+        while True:
+            try:
+                self.snapshots.put_nowait(snapshot)
+                return
+            except queue.Full:
+                try:
+                    self.snapshots.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def latest(self) -> Optional[Snapshot]:
+        """
+        returns the newest published snapshot without blocking, or None if
+        there is not a new one
+        """
+        snapshot = None
+        while True:
+            try:
+                snapshot = self.snapshots.get_nowait()
+            except queue.Empty:
+                return snapshot
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            self.profiler.begin_tick()
+            try:
+                snapshot = self.tick()
+            except OSError as e:
+                # the log or user file does not exist yet or is locked.  The
+                # error repeats every tick, so it is only printed when it
+                # changes
+                if str(e) != self._last_error:
+                    self._last_error = str(e)
+                    print(e)
+            except Exception as e: # pylint: disable=broad-except
+                # an error in one tick must not end the worker, or the gui
+                # would show the last snapshot forever
+                if repr(e) != self._last_error:
+                    self._last_error = repr(e)
+                    traceback.print_exc()
+            else:
+                self._last_error = None
+                if snapshot != self._last:
+                    self._last = snapshot
+                    self.publish(snapshot)
+                    if self.on_snapshot:
+                        self.on_snapshot(snapshot)
+            self.profiler.end_tick()
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> None:
+        """
+        stops the worker after the current tick
+        """
+        self._stop_event.set()
@@ -0,0 +1,125 @@
+"""
+Replays long streams of kill events to rebuild elo ratings.  Players are
+interned to integer ids and their ratings are kept in a contiguous array,
+so a replay is a tight loop over two integer arrays.
+"""
+
+from array import array
+from collections import deque
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from log_parsing import KillEvent
+
+
+def replay_ids(ratings: "array[float]", killers: Sequence[int], victims: Sequence[int],
+               k: float = 30) -> None:
+    """
+    applies the kills of killers[i] on victims[i] to the ratings in place.
+    The arithmetic is the same as calculate_elo, so the results match it
+    exactly.
+    """
+    for ki, vi in zip(killers, victims):
+        killer_elo = ratings[ki]
+        victim_elo = ratings[vi]
+        ratings[ki] = killer_elo + k * (1 - 1 / (1 + 10 ** ((victim_elo - killer_elo) / 400)))
+        ratings[vi] = victim_elo + k * (0 - 1 / (1 + 10 ** ((killer_elo - victim_elo) / 400)))
+
+
+class EloReplay:
+    """
+    The ratings of every player seen in the replayed kill events.
+    """
+
+    def __init__(self, k: float = 30, default: float = 1600.0):
+        self.k = k
+        self.default = default
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.ratings = array("d")
+
+    def intern(self, name: str) -> int:
+        """
+        returns the id of the player, adding the player if it is new
+        """
+        player_id = self.ids.get(name)
+        if player_id is None:
+            player_id = len(self.names)
+            self.ids[name] = player_id
+            self.names.append(name)
+            self.ratings.append(self.default)
+        return player_id
+
+    def intern_events(self, kill_events: Iterable[KillEvent]) -> Tuple["array[int]", "array[int]"]:
+        """
+        returns the killer and victim id arrays of the kill events
+        """
+        killers = array("l")
+        victims = array("l")
+        intern = self.intern
+        for ke in kill_events:
+            killers.append(intern(ke.killer))
+            victims.append(intern(ke.victim))
+        return (killers, victims)
+
+    def replay(self, kill_events: Iterable[KillEvent], batch_size: int = 100_000) -> None:
+        """
+        applies the kill events to the ratings, interning them in batches
+        so a long stream is never held in memory at once
+        """
+        batch: List[KillEvent] = []
+        for ke in kill_events:
+            batch.append(ke)
+            if len(batch) >= batch_size:
+                self.replay_ids(*self.intern_events(batch))
+                batch.clear()
+        self.replay_ids(*self.intern_events(batch))
+
+    def replay_ids(self, killers: Sequence[int], victims: Sequence[int]) -> None:
+        """
+        applies already interned kills to the ratings
+        """
+        replay_ids(self.ratings, killers, victims, self.k)
+
+    def rating(self, name: str) -> float:
+        player_id = self.ids.get(name)
+        return self.default if player_id is None else self.ratings[player_id]
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(zip(self.names, self.ratings))
+
+
+def _replay_game(task: Tuple["array[int]", "array[int]", int, float, float]) -> "array[float]":
+    killers, victims, players, k, default = task
+    ratings = array("d", [default]) * players
+    replay_ids(ratings, killers, victims, k)
+    return ratings
+
+
+def replay_games(games: Iterable[Iterable[KillEvent]], k: float = 30,
+                 default: float = 1600.0,
+                 jobs: Optional[int] = None) -> Iterator[Dict[str, float]]:
+    """
+    replays games that are independent of each other, every player starting
+    each game at the default rating, and yields the final ratings of each
+    game in order.  The games are replayed by a pool of `jobs` processes, or
+    in this process if jobs is 1.
+    """
+    def tasks(names: "deque[List[str]]"):
+        for kill_events in games:
+            game = EloReplay(k, default)
+            killers, victims = game.intern_events(kill_events)
+            names.append(game.names)
+            yield (killers, victims, len(game.names), k, default)
+
+    # the names of the games that were handed out but whose ratings have not
+    # been yielded yet
+    game_names: "deque[List[str]]" = deque()
+    if jobs == 1:
+        results: Iterable = map(_replay_game, tasks(game_names))
+        for ratings in results:
+            yield dict(zip(game_names.popleft(), ratings))
+        return
+    with Pool(jobs) as pool:
+        for ratings in pool.imap(_replay_game, tasks(game_names)):
+            yield dict(zip(game_names.popleft(), ratings))
@@ -0,0 +1,169 @@
+"""
+Caches the events parsed from the log in a sqlite database, so restarting
+the dashboard mid-game applies the cached events instead of parsing the
+game again.
+"""
+
+import json
+import os
+import sqlite3
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type, Union
+
+from log_parsing import (ConnectEvent, DeathEvent, GameStartEvent, GameState, KillEvent,
+                         LeaveEvent, LogEvent, ObjectiveEvent, ServerEvent,
+                         TeamSwitchEvent, parser_version)
+
+CachedEvent = Union[LogEvent, GameStartEvent]
+
+event_types: Dict[str, Type] = {t.__name__: t for t in (
+    KillEvent, ObjectiveEvent, DeathEvent, ConnectEvent, TeamSwitchEvent,
+    LeaveEvent, ServerEvent, GameStartEvent)}
+
+
+# a range of the log whose events are cached, with what identifies the log
+CachedRange = NamedTuple("CachedRange", [("file_id", Tuple[int, int]),
+                                         ("head", bytes),
+                                         ("start", int),
+                                         ("end", int)])
+
+
+def encode_event(line_number: int, event: CachedEvent) -> list:
+    fields = [sorted(f) if isinstance(f, (set, frozenset)) else f for f in event]
+    return [line_number, type(event).__name__] + fields
+
+
+def decode_event(row: list) -> Tuple[int, CachedEvent]:
+    line_number, name, *fields = row
+    if name == "ObjectiveEvent":
+        fields[0] = set(fields[0])
+    elif name == "ServerEvent":
+        fields[0] = tuple(fields[0])
+    return (line_number, event_types[name](*fields))
+
+
+class EventCache:
+    """
+    The events parsed from a byte range of each log, starting at the start
+    of a game.  The range is checked against the log before it is used: the
+    file must be the same file, must start with the same bytes and must
+    still have the same bytes at the end of the range.  The cache is
+    dropped when the parser version or the weapon table changes.
+
+    Events are appended in chunks, one per read of the log.  Only the
+    current game is kept: when a chunk starts a new game, the range starts
+    again at that game and the chunks of the old one are dropped.  The range
+    checked by restore or written by append is remembered, so appending to
+    it does not check the log again.
+    """
+
+    def __init__(self, db_path: str = "tf2_events.db", weapons_key: str = ""):
+        # the cache is used from the compute worker thread
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("create table if not exists log (path text primary key, "
+                          "dev integer, ino integer, head blob, tail blob, key text, "
+                          "start integer, end integer, line_number integer)")
+        self.conn.execute("create table if not exists chunk (path text, start integer, "
+                          "events text, primary key (path, start))")
+        self.conn.commit()
+        self.key = f"{parser_version}:{weapons_key}"
+        self._ranges: Dict[str, CachedRange] = {}
+
+    @staticmethod
+    def _read(f, start: int, end: int) -> bytes:
+        f.seek(max(0, start))
+        return f.read(end - max(0, start))
+
+    def _range(self, log_path: str) -> Optional[Tuple[int, int, int]]:
+        """
+        returns the start, end and line number of the cached range of the
+        log if it still matches the log
+        """
+        row = self.conn.execute("select dev, ino, head, tail, key, start, end, line_number "
+                                "from log where path = ?", (log_path,)).fetchone()
+        if row is None:
+            return None
+        dev, ino, head, tail, key, start, end, line_number = row
+        try:
+            st = os.stat(log_path)
+            if (st.st_dev, st.st_ino) != (dev, ino) or st.st_size < end or key != self.key:
+                return None
+            with open(log_path, "rb") as f:
+                if self._read(f, 0, 64) != head or self._read(f, end - 64, end) != tail:
+                    return None
+        except OSError:
+            return None
+        self._ranges[log_path] = CachedRange((dev, ino), head, start, end)
+        return (start, end, line_number)
+
+    def restore(self, log_path: str, start: int, state: GameState) -> int:
+        """
+        applies the cached events of the game starting at the byte offset to
+        the state and returns the offset the log has to be read from
+        """
+        cached = self._range(log_path)
+        if cached is None or cached[0] != start:
+            self.clear(log_path)
+            return start
+        _, end, line_number = cached
+        for (events,) in self.conn.execute(
+                "select events from chunk where path = ? order by start", (log_path,)):
+            for row in json.loads(events):
+                state.line_number, event = decode_event(row)
+                state.apply_event(event)
+        state.line_number = line_number
+        return end
+
+    def append(self, log_path: str, start: int, end: int, line_number: int,
+               events: List[Tuple[int, CachedEvent]], tail: bytes = b"",
+               game_start: Optional[int] = None) -> None:
+        """
+        adds the events parsed from the bytes between start and end.  If the
+        bytes do not continue the cached range, they start a new one.
+
+        tail can be the bytes of the log before end, so they are not read
+        again.  If the events have a GameStartEvent, game_start is the offset
+        of the game it starts and the range starts again there.
+        """
+        cached = self._ranges.get(log_path)
+        starts = [i for i, (_, e) in enumerate(events) if isinstance(e, GameStartEvent)]
+        if starts:
+            if game_start is None or not start <= game_start < end:
+                # the events cannot be matched to the bytes of the new game
+                self.clear(log_path)
+                return
+            events = events[starts[-1]:]
+            start = game_start
+            cached = None
+        new_range = cached is None or cached.end != start
+        if new_range:
+            with open(log_path, "rb") as f:
+                head = self._read(f, 0, 64)
+            st = os.stat(log_path)
+            cached = CachedRange((st.st_dev, st.st_ino), head, start, end)
+        else:
+            cached = cached._replace(end=end)
+        if len(tail) < min(64, end):
+            with open(log_path, "rb") as f:
+                tail = self._read(f, end - 64, end)
+        self._ranges[log_path] = cached
+
+        with self.conn:
+            if new_range:
+                self.conn.execute("delete from chunk where path = ?", (log_path,))
+            self.conn.execute("insert or replace into log values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              (log_path, *cached.file_id, cached.head, tail[-64:], self.key,
+                               cached.start, end, line_number))
+            if events:
+                self.conn.execute("insert or replace into chunk values (?, ?, ?)",
+                                  (log_path, start,
+                                   json.dumps([encode_event(n, e) for n, e in events])))
+
+    def clear(self, log_path: str) -> None:
+        self._ranges.pop(log_path, None)
+        with self.conn:
+            self.conn.execute("delete from log where path = ?", (log_path,))
+            self.conn.execute("delete from chunk where path = ?", (log_path,))
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,204 @@
+"""
+Replays a recorded game from the log so it can be played back or scrubbed
+through.  The game state is checkpointed in memory every `every` lines, so
+seeking to any line restores at most one checkpoint and applies at most
+`every` lines.  The checkpoints are made every so many lines rather than
+events because the replay seeks by line, and most lines of a game are
+events.
+
+The events parsed from the lines are saved as json into a sidecar file next
+to the log, like the rows of the event cache, so replaying the game again
+applies the saved events instead of parsing it.  The sidecar is only data:
+the log directory is writable by anyone who can write the log, so nothing
+read from it is unpickled.
+
+The kill events make up most of a game state and each checkpoint only adds
+to the events of the one before, so the events are kept once and a
+checkpoint only keeps how many of them it had.
+"""
+
+import bisect
+import json
+import pickle
+from typing import Dict, List, Optional, Tuple
+
+from dashboard_model import Snapshot, build_snapshot
+from event_cache import CachedEvent, decode_event, encode_event
+from log_parsing import EventStore, GameState, parser_version, state_version
+from log_reader import GameIndex, read_range
+from weapons import weapons_key
+
+
+class GameReplay:
+    """
+    The lines of game n of the log and checkpoints of the game state of the
+    user.  Position i is the state after the first i lines of the game.
+    Raises ValueError if the log does not have game n.
+    """
+
+    def __init__(self, log_path: str, user: str, weapon_class: Dict[str, str],
+                 weapon_dmg: Dict[str, str], game: int = -1, every: int = 500,
+                 events_path: Optional[str] = None):
+        self.log_path = log_path
+        self.user = user
+        self.weapon_class = weapon_class
+        self.weapon_dmg = weapon_dmg
+        # the states hold the classes and damage types of the kills
+        self.weapons_key = weapons_key(weapon_class, weapon_dmg)
+        self.every = every
+        index = GameIndex(log_path)
+        index.update()
+        if not len(index):
+            raise ValueError(f"no games in {log_path}")
+        if not -len(index) <= game < len(index):
+            raise ValueError(f"{log_path} has {len(index)} games, there is no game {game}")
+        self.start, self.end = index.game_range(game)
+        self.file_id = index.file_id
+        self.lines = read_range(log_path, self.start, self.end)
+        self.events_path = (events_path if events_path
+                            else f"{log_path}.{self.start}.events")
+        # the events of the first `parsed` lines and the positions after
+        # their lines
+        self.events: List[CachedEvent] = []
+        self.event_positions: List[int] = []
+        self.parsed = 0
+        # checkpoints[c] is the state at position c * every as the index of
+        # its event store, its number of events and the state pickled in
+        # memory without the events.  A new store starts when the state is
+        # reset.
+        self.checkpoints: List[Tuple[int, int, bytes]] = []
+        self.stores: List[EventStore] = []
+        self.position = 0
+        self.state = self._new_state()
+        self._load()
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def _new_state(self) -> GameState:
+        # the log has no timestamps, so the replayed metrics only have their
+        # event window
+        return GameState(self.user, self.weapon_class, self.weapon_dmg, clock=None)
+
+    def _key(self) -> list:
+        # the events of another parser, GameState or weapon table are parsed
+        # again.  GameState matters because the names it knows split the
+        # ambiguous lines.
+        return [parser_version, state_version, self.weapons_key, list(self.file_id or ()),
+                self.start, self.user]
+
+    def _load(self) -> None:
+        try:
+            with open(self.events_path, encoding="utf-8") as f:
+                data = json.load(f)
+            # the events of a game that is still being written stay valid as
+            # the game grows
+            if data["key"] != self._key() or data["lines"] > len(self.lines):
+                return
+            events = [decode_event(row) for row in data["events"]]
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            # a missing, truncated or stale file is parsed again
+            return
+        self.event_positions = [position for position, _ in events]
+        self.events = [event for _, event in events]
+        self.parsed = data["lines"]
+
+    def _save(self) -> None:
+        data = {"key": self._key(), "lines": self.parsed,
+                "events": [encode_event(position, event) for position, event
+                           in zip(self.event_positions, self.events)]}
+        try:
+            with open(self.events_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        except OSError:
+            # the events are only a cache, so the game can still be parsed
+            pass
+
+    def _build(self) -> None:
+        """
+        checkpoints the game, applying the saved events and parsing the lines
+        after them
+        """
+        loaded = self.parsed
+        self.checkpoints.append(self._checkpoint())
+        while self.position + self.every <= len(self.lines):
+            self._advance(self.position + self.every)
+            self.checkpoints.append(self._checkpoint())
+        self._advance(len(self.lines))
+        if self.parsed > loaded:
+            self._save()
+
+    def _checkpoint(self) -> Tuple[int, int, bytes]:
+        events = self.state.kill_events
+        if not self.stores or self.stores[-1] is not events:
+            self.stores.append(events)
+        self.state.kill_events = None # type: ignore
+        try:
+            data = pickle.dumps(self.state, pickle.HIGHEST_PROTOCOL)
+        finally:
+            self.state.kill_events = events
+        return (len(self.stores) - 1, len(events), data)
+
+    def _restore(self, checkpoint: int) -> None:
+        store_index, events, data = self.checkpoints[checkpoint]
+        self.state = pickle.loads(data)
+        store = self.stores[store_index]
+        # the newest store only ever grows along the game, so it can be
+        # continued when nothing was added after the checkpoint
+        if store_index == len(self.stores) - 1 and events == len(store):
+            self.state.kill_events = store
+        else:
+            self.state.kill_events = store.prefix(events)
+        self.state.weapon_class = self.weapon_class
+        self.state.weapon_dmg = self.weapon_dmg
+        self.position = checkpoint * self.every
+
+    def _advance(self, position: int) -> None:
+        """
+        moves the state forward to the position.  The lines with known
+        events are applied without parsing them, which is the same as
+        process_line: every line counts in line_number and only the lines
+        with an event change the stats.
+        """
+        state = self.state
+        known = min(position, self.parsed)
+        if self.position < known:
+            positions = self.event_positions
+            first = bisect.bisect_right(positions, self.position)
+            last = bisect.bisect_right(positions, known)
+            line = self.position
+            for event_position, event in zip(positions[first:last], self.events[first:last]):
+                state.line_number += event_position - line
+                line = event_position
+                state.apply_event(event)
+            state.line_number += known - line
+            self.position = known
+        if self.position < position:
+            for line_text in self.lines[self.position:position]:
+                event = state.process_line(line_text)
+                self.position += 1
+                if event is not None:
+                    self.events.append(event)
+                    self.event_positions.append(self.position)
+            self.parsed = position
+
+    def seek(self, position: int) -> GameState:
+        """
+        returns the game state after the first `position` lines.  Playing
+        forward continues from the current state, anything else restores
+        the nearest checkpoint before the position.  The state belongs to the
+        replay and changes with the next seek.
+        """
+        position = max(0, min(len(self.lines), position))
+        if not self.position <= position < self.position + self.every:
+            self._restore(min(position // self.every, len(self.checkpoints) - 1))
+        self._advance(position)
+        return self.state
+
+    def snapshot(self, position: int) -> Snapshot:
+        """
+        returns the dashboard snapshot after the first `position` lines
+        """
+        return build_snapshot(self.seek(position))
+
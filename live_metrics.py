@@ -0,0 +1,166 @@
+"""
+Sliding window metrics of the current game: who is active, kills and
+deaths per minute and the recent kill/death ratio of the user and teams.
+"""
+
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Optional, Set, Tuple
+
+
+class WindowCounts:
+    """
+    The kills and deaths of each player among the events in a window.
+    Players without events in the window are dropped.
+    """
+
+    def __init__(self):
+        self.kills: Dict[str, int] = {}
+        self.deaths: Dict[str, int] = {}
+
+    def add(self, killer: str, victim: str) -> None:
+        if killer:
+            self.kills[killer] = self.kills.get(killer, 0) + 1
+        self.deaths[victim] = self.deaths.get(victim, 0) + 1
+
+    def remove(self, killer: str, victim: str) -> None:
+        if killer:
+            _decrement(self.kills, killer)
+        _decrement(self.deaths, victim)
+
+    def players(self) -> Set[str]:
+        return set(self.kills) | set(self.deaths)
+
+    def kd(self, players: Iterable[str]) -> float:
+        """
+        returns the kill/death ratio of the players.  Without deaths it is
+        the number of kills.
+        """
+        kills = 0
+        deaths = 0
+        for p in players:
+            kills += self.kills.get(p, 0)
+            deaths += self.deaths.get(p, 0)
+        return kills / deaths if deaths else float(kills)
+
+
+def _decrement(counts: Dict[str, int], player: str) -> None:
+    count = counts[player] - 1
+    if count:
+        counts[player] = count
+    else:
+        del counts[player]
+
+
+class SlidingWindowMetrics:
+    """
+    Counts the kills and deaths of each player over the last `seconds`
+    seconds and over the last `events` events.  Events are timestamped with
+    `clock` as they are added.  Without a clock, for example when a game is
+    replayed, there is only the event window and the rates are 0.
+
+    Events that happened before now, like the backlog read when the
+    dashboard starts, must not be timestamped as they are processed or they
+    would all land in the time window at once.  They are added without a
+    clock, and start sets the clock once they are caught up.
+
+    Both windows are ring buffers: adding an event pushes it into the
+    buffers and every event that falls out of a window is subtracted from
+    the counts, so each event costs O(1) amortized.  The time window holds at
+    most `capacity` events, so memory is bounded however long the game runs.
+    """
+
+    def __init__(self, seconds: float = 120.0, events: int = 100,
+                 capacity: int = 10_000,
+                 clock: Optional[Callable[[], float]] = time.monotonic):
+        self.seconds = seconds
+        self.events = events
+        self.capacity = capacity
+        self.clock = clock
+        self.started = clock() if clock else 0.0
+        # a death without a killer has "" as the killer
+        self._timed: Deque[Tuple[float, str, str]] = deque()
+        self._recent: Deque[Tuple[str, str]] = deque()
+        self.timed = WindowCounts()
+        self.recent = WindowCounts()
+
+    def start(self, clock: Optional[Callable[[], float]]) -> None:
+        """
+        timestamps the events added from now on with the clock.  The rates
+        are over the time since the start.
+        """
+        self.clock = clock
+        self.started = clock() if clock else 0.0
+
+    def add_kill(self, killer: str, victim: str) -> None:
+        """
+        adds a kill, or a death without a killer if killer is ""
+        """
+        if self.clock:
+            now = self.clock()
+            self._expire(now)
+            if len(self._timed) >= self.capacity:
+                _, old_killer, old_victim = self._timed.popleft()
+                self.timed.remove(old_killer, old_victim)
+            self._timed.append((now, killer, victim))
+            self.timed.add(killer, victim)
+
+        if len(self._recent) >= self.events:
+            self.recent.remove(*self._recent.popleft())
+        self._recent.append((killer, victim))
+        self.recent.add(killer, victim)
+
+    def add_death(self, player: str) -> None:
+        """
+        adds a death without a killer, like a suicide or fall
+        """
+        self.add_kill("", player)
+
+    def _expire(self, now: float) -> None:
+        limit = now - self.seconds
+        timed = self._timed
+        while timed and timed[0][0] < limit:
+            _, killer, victim = timed.popleft()
+            self.timed.remove(killer, victim)
+
+    def _minutes(self) -> float:
+        """
+        expires the old events and returns the length of the time window in
+        minutes.  At the start of the game it is the time since the start,
+        but at least ten seconds so the first kill is not a spike.
+        """
+        now = self.clock() if self.clock else 0.0
+        self._expire(now)
+        return max(10.0, min(self.seconds, now - self.started)) / 60
+
+    def active_players(self) -> Set[str]:
+        """
+        returns the players with a kill or death in either window
+        """
+        if self.clock:
+            self._expire(self.clock())
+        return self.timed.players() | self.recent.players()
+
+    def kills_per_minute(self, players: Iterable[str]) -> float:
+        if not self.clock:
+            return 0.0
+        minutes = self._minutes()
+        return sum(self.timed.kills.get(p, 0) for p in players) / minutes
+
+    def deaths_per_minute(self, players: Iterable[str]) -> float:
+        if not self.clock:
+            return 0.0
+        minutes = self._minutes()
+        return sum(self.timed.deaths.get(p, 0) for p in players) / minutes
+
+    def kd(self, players: Iterable[str]) -> float:
+        """
+        returns the kill/death ratio of the players over the time window,
+        or over the event window without a clock or events in the time
+        window, like right after the backlog of a game was caught up
+        """
+        if self.clock:
+            self._expire(self.clock())
+        if not self.clock or not self._timed:
+            return self.recent.kd(players)
+        return self.timed.kd(players)
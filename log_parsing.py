@@ -1,29 +1,114 @@
-from typing import List, Dict, Tuple, Set, NamedTuple, Optional
+from typing import List, Dict, Tuple, Set, NamedTuple, Optional, Union, Iterable, Iterator, Sequence, Callable, FrozenSet
+from array import array
+from collections.abc import Sequence as SequenceABC
 import socket
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import re
-import a2s # type: ignore
-import networkx as nx
+import time
 
-server_re = r"^Connected to \d{1,3}.\d{1,3}.\d{1,3}.\d{1,3}.:\d{1,5}$"
+from live_metrics import SlidingWindowMetrics
+from roster_tracker import RosterTracker
+
+server_re = re.compile(r"^Connected to (?P<host>\d{1,3}(?:\.\d{1,3}){3}):(?P<port>\d{1,5})$")
 KillEvent = NamedTuple("KillEvent", [("killer", str),
                                      ("victim", str),
-                                     ("weapon", str)])
+                                     ("weapon", str),
+                                     ("crit", bool)])
 
 ObjectiveEvent = NamedTuple("ObjectiveEvent", [("players", Set[str]),
                                                ("objective", str),
                                                ("team", str)])
 
+# "died." or "suicided."
+DeathEvent = NamedTuple("DeathEvent", [("player", str), ("cause", str)])
+ConnectEvent = NamedTuple("ConnectEvent", [("player", str)])
+TeamSwitchEvent = NamedTuple("TeamSwitchEvent", [("player", str)])
+LeaveEvent = NamedTuple("LeaveEvent", [("player", str), ("reason", str)])
+# "Connected to {host}:{port}" when the user joins a server
+ServerEvent = NamedTuple("ServerEvent", [("address", Tuple[str, int])])
+
+LogEvent = Union[KillEvent, ObjectiveEvent, DeathEvent, ConnectEvent,
+                 TeamSwitchEvent, LeaveEvent, ServerEvent]
+# the "Team Fortress" line that starts a game
+GameStartEvent = NamedTuple("GameStartEvent", [])
+
+# bumped when the events parsed from a line can change, so cached events
+# are parsed again
+parser_version = 1
+
+kill_re = re.compile(r"^(?P<users>.*) with .*?(?P<weapon>\S+\.)(?P<crit> \(crit\))?$")
+objective_re = re.compile(
+    r"^(?P<users>.*) (defended|captured) (?P<objective>.*) for team #(?P<team>[23])\s+$")
+death_re = re.compile(r"^(?P<player>.*) (?P<cause>died|suicided)\.$")
+team_switch_re = re.compile(r"^(?P<player>.*) was moved to the other team for game balance$")
+leave_re = re.compile(r"^(?P<player>.*) left the game(?: \((?P<reason>.*)\))?\.?$")
+teams = {"3": "blue", "2":"red"}
+
+damage_types = ("bleed", "bullet", "explosive", "fire", "melee", "many",
+                "fall", "crush", "critical")
+
+def classify_line(line: str, names) -> Optional[LogEvent]:
+    """
+    Classifies a line of the log and returns its event, or None if the line
+    is not an event.  Each line is only matched against the patterns that
+    its ending allows.
+    """
+    stripped = line.rstrip()
+    if stripped.endswith("connected"):
+        return parse_connect_line(line)
+    if stripped.startswith("Connected to "):
+        match = server_re.match(stripped)
+        if match:
+            return ServerEvent((match.group("host"), int(match.group("port"))))
+    if stripped.endswith(".") or stripped.endswith(" (crit)"):
+        if " killed " in stripped and " with " in stripped:
+            return parse_kill_line(line, names)
+        match = death_re.match(stripped)
+        if match:
+            return DeathEvent(match.group("player"), match.group("cause"))
+    if " for team #" in stripped:
+        return parse_objective_line(line, names)
+    if stripped.endswith("for game balance"):
+        match = team_switch_re.match(stripped)
+        if match:
+            return TeamSwitchEvent(match.group("player"))
+    if " left the game" in stripped:
+        match = leave_re.match(stripped)
+        if match:
+            return LeaveEvent(match.group("player"), match.group("reason") or "")
+    return None
+
+
+def parse_connect_line(line: str) -> Optional[ConnectEvent]:
+    """
+    returns the connect event of a "{player} connected" line, or None
+    """
+    stripped = line.strip()
+    if stripped.endswith("connected"):
+        return ConnectEvent(stripped[:-10])
+    return None
+
+
+def classify_lines(lines: Iterable[str], names) -> Iterator[Tuple[str, Optional[LogEvent]]]:
+    """
+    yields each line of the log with its event.  A set of names is indexed
+    once for all the lines.
+    """
+    index = as_name_index(names)
+    for line in lines:
+        yield line, classify_line(line, index)
+
+
 def read_connections(lines: List[str]) -> Set[str]:
     """
     Reads the player event connection events from
     the log to get the usernames.
     """
-    usernames = set()
-    for line in lines:
-        if line.strip().endswith("connected"):
-            usernames.add(line.strip()[:-10])
-    return usernames
+    usernames = NameIndex()
+    for _, event in classify_lines(lines, usernames):
+        if isinstance(event, ConnectEvent):
+            usernames.add(event.player)
+    return set(usernames)
 
 
 def explained_points(lines:List[str], users:Set[str]) -> Dict[str, int]:
@@ -35,14 +120,11 @@ def explained_points(lines:List[str], users:Set[str]) -> Dict[str, int]:
     https://wiki.teamfortress.com/wiki/Scoreboard
     """
     user_points: Dict[str, int] = defaultdict(lambda: 0)
-    for line in lines:
-        kill_event = parse_kill_line(line, users)
-        if kill_event:
-            user_points[kill_event.killer] += 1
-            continue
-        objective_event = parse_objective_line(line, users)
-        if objective_event:
-            for player in objective_event.players:
+    for _, event in classify_lines(lines, users):
+        if isinstance(event, KillEvent):
+            user_points[event.killer] += 1
+        elif isinstance(event, ObjectiveEvent):
+            for player in event.players:
                 user_points[player] += 1
     return user_points
                 
@@ -71,14 +153,16 @@ def latest_game_lines(lines: List[str], user: str) -> List[str]:
     gets the game lines for the most recent or currently running game.
     """
     game_lines: List[str] = []
+    # only the connect lines matter, so the other lines are not classified
     for l in lines:
-        if f"{user} connected" == l.strip():
+        event = parse_connect_line(l)
+        if event is not None and event.player == user:
             game_lines = [l]
         else:
             game_lines.append(l)
     return game_lines
 
-def get_killstreak(user: str, kill_events: List[KillEvent]) -> int:
+def get_killstreak(user: str, kill_events: Sequence[KillEvent]) -> int:
     """
     returns the killstreak for the given user in the kill event list
     """
@@ -90,7 +174,7 @@ def get_killstreak(user: str, kill_events: List[KillEvent]) -> int:
             return streak_kills
     return streak_kills
 
-def get_killstreaks(kill_events: List[KillEvent]) -> Dict[str, List[int]]:
+def get_killstreaks(kill_events: Iterable[KillEvent]) -> Dict[str, List[int]]:
     """
     Returns each killstreak 
     """
@@ -102,45 +186,280 @@ def get_killstreaks(kill_events: List[KillEvent]) -> Dict[str, List[int]]:
     return killstreaks
 
 
-def get_teams(user: str, kill_events: List[KillEvent]):
+class EventView(SequenceABC):
     """
-    gets the ally and enemy teams of the given user by viewing the kill_event
-    list
+    A read only view of a range of the events in an event store.  Slicing a
+    view returns another view, so nothing is copied.
     """
-    g = nx.Graph()
-    g.add_node(user)
 
-    # older kill events will have higher weights so newer
-    # events will be prioritized.  This is done because
-    # players can change teams
-    weights = range( (len(kill_events)-1) * 100, 0, -100)
+    def __init__(self, store: "EventStore", indexes: range):
+        self._store = store
+        self._indexes = indexes
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return EventView(self._store, self._indexes[index])
+        return self._store.event(self._indexes[index])
+
+
+class EventStore(SequenceABC):
+    """
+    The kill events of a game stored as parallel arrays of interned ids
+    instead of a list of KillEvent tuples.  Player and weapon names are
+    stored once in `strings`, and each event takes a few bytes per column.
+
+    The store reads like a list of KillEvent.  Slices such as
+    kill_events[-100:] are views that do not copy the events.
+    """
+
+    def __init__(self, kill_events: Iterable[KillEvent] = ()):
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self.killers = array("i")
+        self.victims = array("i")
+        self.weapons = array("i")
+        self.crits = array("b")
+        # the line number of each event in the game, or -1 if unknown
+        self.lines = array("q")
+        for ke in kill_events:
+            self.append(ke)
+
+    def intern(self, s: str) -> int:
+        """
+        returns the id of the string, adding it if it is new
+        """
+        string_id = self._string_ids.get(s)
+        if string_id is None:
+            string_id = len(self.strings)
+            self._string_ids[s] = string_id
+            self.strings.append(s)
+        return string_id
 
-    for w, ke in zip(weights, kill_events):
-        g.add_edge(ke.killer, ke.victim, weight=w)
+    def add(self, killer: str, victim: str, weapon: str = "", crit: bool = False,
+            line: int = -1) -> None:
+        """
+        adds a kill to the end of the store
+        """
+        self.killers.append(self.intern(killer))
+        self.victims.append(self.intern(victim))
+        self.weapons.append(self.intern(weapon))
+        self.crits.append(crit)
+        self.lines.append(line)
 
+    def append(self, kill_event: KillEvent, line: int = -1) -> None:
+        """
+        adds a kill event to the end of the store
+        """
+        self.add(kill_event.killer, kill_event.victim, kill_event.weapon,
+                 kill_event.crit, line)
 
-    allies = set()
-    enemies = set()
-    for n in g.nodes:
-        try:
-            _, path = nx.bidirectional_dijkstra(g, user, n)
-            if len(path) == 1 or len(path) % 2 == 1:
-                allies.add(n)
-            elif len(path) % 2 == 0:
-                enemies.add(n)
-        except nx.NetworkXNoPath:
-            pass
-    return (allies, enemies)
+    def prefix(self, n: int) -> "EventStore":
+        """
+        returns a copy of the store with only its first n events
+        """
+        store = EventStore()
+        store.strings = self.strings[:]
+        store._string_ids = dict(self._string_ids)
+        store.killers = self.killers[:n]
+        store.victims = self.victims[:n]
+        store.weapons = self.weapons[:n]
+        store.crits = self.crits[:n]
+        store.lines = self.lines[:n]
+        return store
+
+    def event(self, i: int) -> KillEvent:
+        """
+        returns the i-th event as a KillEvent
+        """
+        strings = self.strings
+        return KillEvent(strings[self.killers[i]], strings[self.victims[i]],
+                         strings[self.weapons[i]], bool(self.crits[i]))
+
+    def __len__(self) -> int:
+        return len(self.killers)
+
+    def __getitem__(self, index):
+        indexes = range(len(self.killers))
+        if isinstance(index, slice):
+            return EventView(self, indexes[index])
+        return self.event(indexes[index])
+
+
+class TeamTracker:
+    """
+    Infers the teams from kill events with a union-find where every player
+    stores whether it is on the same team as its parent.  A kill puts the
+    killer and victim on opposite teams, so each kill is a near constant
+    time union.  Players are interned to integer ids so the union-find is
+    kept in flat lists.
+
+    Players can change teams, so a kill can contradict the teams seen so
+    far.  When that happens, the union-find is rebuilt from the newest kill
+    to the oldest and older kills that contradict newer ones are skipped.
+    Only the latest kill between each pair of players can change the
+    rebuilt teams, so the pairs are kept ordered by their latest kill and a
+    rebuild costs the number of pairs instead of the number of kills.
+
+    Team changes that are known from the log are fed in directly.  The id
+    of a player that leaves or is moved by autobalance is retired: it is
+    hidden from the teams but keeps its pairs, because they can be all that
+    links two other players.  The next kill of the player gets a new id, and
+    a moved player is paired with its old id on the other team.
+    """
+
+    def __init__(self, kill_events: Iterable[KillEvent] = ()):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        # the pairs of player ids in the order of their latest kill, with 1
+        # if they are on opposite teams and 0 if they are on the same team
+        self._pairs: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        # the retired ids of players that left or switched teams
+        self._gone: Set[int] = set()
+        self._parent: List[int] = []
+        # 1 if the player is on the other team from its parent
+        self._parity: List[int] = []
+        self._rank: List[int] = []
+        for ke in kill_events:
+            self.add_kill(ke.killer, ke.victim)
+
+    def _find(self, player: int) -> Tuple[int, int]:
+        parent = self._parent
+        path = []
+        while parent[player] != player:
+            path.append(player)
+            player = parent[player]
+        root = player
+
+        # compressing the path so every player on it points at the root
+        parity = 0
+        for p in reversed(path):
+            parity ^= self._parity[p]
+            self._parity[p] = parity
+            parent[p] = root
+        return root, self._parity[path[0]] if path else 0
+
+    def _union(self, a: int, b: int, opposite: int = 1) -> bool:
+        """
+        puts a and b on opposite teams, or on the same team if opposite is 0.
+        Returns False if that contradicts the known teams.
+        """
+        root_a, parity_a = self._find(a)
+        root_b, parity_b = self._find(b)
+        if root_a == root_b:
+            return parity_a ^ parity_b == opposite
+
+        rank = self._rank
+        if rank[root_a] < rank[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._parity[root_b] = parity_a ^ parity_b ^ opposite
+        if rank[root_a] == rank[root_b]:
+            rank[root_a] += 1
+        return True
+
+    def _intern(self, player: str) -> int:
+        player_id = self._ids.get(player)
+        if player_id is None:
+            player_id = len(self._names)
+            self._ids[player] = player_id
+            self._names.append(player)
+            self._parent.append(player_id)
+            self._parity.append(0)
+            self._rank.append(0)
+        return player_id
+
+    def _rebuild(self) -> None:
+        players = len(self._names)
+        self._parent = list(range(players))
+        self._parity = [0] * players
+        self._rank = [0] * players
+        union = self._union
+        for (a, b), opposite in reversed(self._pairs.items()):
+            union(a, b, opposite)
+
+    def _add_pair(self, a: int, b: int, opposite: int) -> None:
+        pair = (a, b) if a < b else (b, a)
+        if pair in self._pairs:
+            self._pairs.move_to_end(pair)
+        self._pairs[pair] = opposite
+        if not self._union(a, b, opposite):
+            self._rebuild()
+
+    def _retire(self, player: str) -> Optional[int]:
+        """
+        hides the id of the player from the teams and returns it, so the next
+        kill of the player gets a new id
+        """
+        player_id = self._ids.pop(player, None)
+        if player_id is not None:
+            self._gone.add(player_id)
+        return player_id
+
+    def add_kill(self, killer: str, victim: str) -> None:
+        """
+        updates the teams with a kill
+        """
+        if killer == victim:
+            return
+        self._add_pair(self._intern(killer), self._intern(victim), 1)
+
+    def remove_player(self, player: str) -> None:
+        """
+        removes a player that left the game from the teams
+        """
+        self._retire(player)
+
+    def switch_team(self, player: str) -> None:
+        """
+        moves a player to the other team
+        """
+        old_id = self._retire(player)
+        if old_id is not None:
+            self._add_pair(self._intern(player), old_id, 1)
+
+    def teams(self, user: str) -> Tuple[Set[str], Set[str]]:
+        """
+        returns the allies (including the user) and the enemies of the user
+        """
+        allies = {user}
+        enemies: Set[str] = set()
+        user_id = self._ids.get(user)
+        if user_id is None:
+            return (allies, enemies)
+
+        user_root, user_parity = self._find(user_id)
+        gone = self._gone
+        for p, name in enumerate(self._names):
+            root, parity = self._find(p)
+            if root != user_root or p in gone:
+                continue
+            if parity == user_parity:
+                allies.add(name)
+            else:
+                enemies.add(name)
+        return (allies, enemies)
+
+
+def get_teams(user: str, kill_events: Iterable[KillEvent]):
+    """
+    gets the ally and enemy teams of the given user by viewing the kill_event
+    list
+    """
+    return TeamTracker(kill_events).teams(user)
 
 
 def read_server_usernames(lines: List[str]) -> Set:
     """
     connects to the latest server and returns the users connected to it
     """
-    latest_connection: str = [a for a in lines if re.match(server_re, a)][-1]
+    latest_connection: str = [a for a in lines if server_re.match(a)][-1]
     server_str = latest_connection.split()[-1].split(":")
     server = (server_str[0], int(server_str[1]))
 
+    import a2s # type: ignore #pylint: disable=import-outside-toplevel
     names = set()
     try:
         names.update({p.name for p in a2s.players(server)})
@@ -148,28 +467,149 @@ def read_server_usernames(lines: List[str]) -> Set:
         print("tf2 server connection timeout")
     return names
 
-def parse_objective_line(line:str, names: Set[str]) -> Optional[ObjectiveEvent]:
-    pat = r"^(?P<users>.*) (defended|captured) (?P<objective>.*) for team #(?P<team>[23])\s+$"
-    teams = {"3": "blue", "2":"red"}
-    match = re.search(pat, line)
+class NameIndex:
+    """
+    A set of usernames indexed by a prefix trie and a suffix trie.  It is
+    used to split lines where a username contains " killed " or ", ".
+    Walking a trie along a line stops as soon as no username continues, so
+    finding the usernames at a position costs at most the length of the
+    longest username (32 characters in tf2) instead of a comparison with
+    every known username.
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._names: Set[str] = set()
+        self._prefixes: Dict = {}
+        self._suffixes: Dict = {}
+        self.update(names)
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str) -> None:
+        """
+        adds a username to the index
+        """
+        if name in self._names:
+            return
+        self._names.add(name)
+        for trie, chars in ((self._prefixes, name), (self._suffixes, name[::-1])):
+            node = trie
+            for c in chars:
+                node = node.setdefault(c, {})
+            node[None] = True
+
+    def update(self, names: Iterable[str]) -> None:
+        """
+        adds several usernames to the index
+        """
+        for name in names:
+            self.add(name)
+
+    def discard(self, name: str) -> None:
+        """
+        removes a username from the index if it is present
+        """
+        if name not in self._names:
+            return
+        self._names.discard(name)
+        for trie, chars in ((self._prefixes, name), (self._suffixes, name[::-1])):
+            path = [trie]
+            for c in chars:
+                path.append(path[-1][c])
+            del path[-1][None]
+            # pruning the branches that no longer lead to a username
+            for node, c in zip(path[-2::-1], chars[::-1]):
+                if node[c]:
+                    break
+                del node[c]
+
+    def name_ends(self, s: str, start: int = 0) -> List[int]:
+        """
+        returns the end indexes of the usernames that start at s[start]
+        """
+        ends = []
+        node = self._prefixes
+        for i in range(start, len(s)):
+            node = node.get(s[i])
+            if node is None:
+                break
+            if None in node:
+                ends.append(i + 1)
+        return ends
+
+    def name_starts(self, s: str) -> List[int]:
+        """
+        returns the start indexes of the usernames that end at the end of s
+        """
+        starts = []
+        node = self._suffixes
+        for i in range(len(s) - 1, -1, -1):
+            node = node.get(s[i])
+            if node is None:
+                break
+            if None in node:
+                starts.append(i)
+        return starts
+
+    def split_kill(self, user_line: str) -> Optional[Tuple[str, str]]:
+        """
+        splits "{killer} killed {victim}" into the killer and victim when
+        both are known usernames
+        """
+        victim_starts = set(self.name_starts(user_line))
+        for end in self.name_ends(user_line):
+            if (user_line.startswith(" killed ", end)
+                    and end + len(" killed ") in victim_starts):
+                return (user_line[:end], user_line[end + len(" killed "):])
+        return None
+
+    def split_list(self, user_str: str) -> Set[str]:
+        """
+        splits a ", " separated list of usernames.  If the list cannot be
+        split into known usernames, the usernames found at the start of
+        the list are returned.
+        """
+        # depth first search over the positions where a username can start,
+        # trying the longest username first
+        stack: List[Tuple[int, List[str]]] = [(0, [])]
+        seen = set()
+        best: List[str] = []
+        while stack:
+            start, users = stack.pop()
+            if len(users) > len(best):
+                best = users
+            for end in self.name_ends(user_str, start):
+                name = user_str[start:end]
+                if end == len(user_str):
+                    return set(users + [name])
+                if user_str.startswith(", ", end) and end + 2 not in seen:
+                    seen.add(end + 2)
+                    stack.append((end + 2, users + [name]))
+        return set(best)
+
+
+def as_name_index(names) -> NameIndex:
+    """
+    returns the names as a NameIndex.  Indexing a set costs the total length
+    of its names, so callers parsing many lines should index the names once
+    and pass the index.
+    """
+    return names if isinstance(names, NameIndex) else NameIndex(names)
+
+
+def parse_objective_line(line:str, names) -> Optional[ObjectiveEvent]:
+    match = objective_re.search(line)
     if not match:
         return None
-    
-    users = set()
-    user_str = match.group("users")
-    for _ in range(len(names) * len(names)):
-        if not user_str:
-            break
-        
-        for n in names:
-            if user_str.startswith(n + ", "):
-                users.add(n)
-                user_str = user_str[len(n) + 2:]
-            elif user_str == n:
-                users.add(n)
-                user_str = ""
-                break
 
+    users = as_name_index(names).split_list(match.group("users"))
     return ObjectiveEvent(users, match.group("objective"), teams[match.group("team")])
 
 def parse_kill_line(line: str, names) -> Optional[KillEvent]:
@@ -177,29 +617,333 @@ def parse_kill_line(line: str, names) -> Optional[KillEvent]:
     Parses the lines of a log.  If it is a valid kill event, it
     returns a kill event.  Otherwise, it returns None.
     """
-    pat = r"(?P<users>.*) with (?P<weapon>\w+)\.( \(crit\))?\s*$"
-    # line[:-7] removes the " (crit)" at the end of the line
-    nocrit = line[:-7] if line.strip().endswith(" (crit)") else line
-    if " killed " not in nocrit:
-        return None
-    if " with " not in nocrit:
+    match = kill_re.match(line.rstrip())
+    if not match:
         return None
-    if not nocrit.strip().endswith("."):
+    user_line = match.group("users")
+    if " killed " not in user_line:
         return None
 
-    weapon = nocrit.split()[-1]
-    weapon_index = line.rfind(" with ")
-    user_line = line[:weapon_index]
-    if len(user_line.split(" killed ")) == 2:
+    weapon = match.group("weapon")
+    crit = match.group("crit") is not None
+    if user_line.count(" killed ") == 1:
         killer, victim = user_line.split(" killed ")
-        return KillEvent(killer, victim, weapon)
+        return KillEvent(killer, victim, weapon, crit)
 
+    users = as_name_index(names).split_kill(user_line)
+    if users:
+        return KillEvent(users[0], users[1], weapon, crit)
+    return None
 
-    potential_killers = [n for n in names if user_line.strip().startswith(n + " killed ")]
-    potential_victims = [n for n in names if user_line.strip().endswith(" killed " + n)]
 
-    for pk in potential_killers:
-        for pv in potential_victims:
-            if user_line == f"{pk} killed {pv}":
-                return KillEvent(pk, pv, weapon)
-    return None
+class SeededElo(dict):
+    """
+    A dictionary of player elo where a missing player starts at the rating
+    returned by `seed`, for example their career rating.
+    """
+
+    def __init__(self, seed):
+        super().__init__()
+        self.seed = seed
+
+    def __missing__(self, name: str) -> float:
+        elo = self.seed(name)
+        self[name] = elo
+        return elo
+
+
+def _default_elo() -> float:
+    return 1600.0
+
+
+def _first_life() -> List[int]:
+    return [0]
+
+
+def _kill_counts() -> Dict[str, int]:
+    return defaultdict(int)
+
+
+# bumped when the attributes of GameState change, so pickled states like
+# the replay checkpoints are built again
+state_version = 3
+
+# the per-player stats of GameState that are archived when a player leaves
+_player_tables = ("player_elo", "killstreaks", "player_kills", "player_deaths",
+                  "player_dmg_kills", "player_class", "points")
+
+
+class GameState:
+    """
+    The stats of the current game for the given user.  Log lines are fed in
+    as they arrive and every stat is updated in place, so the cost of an
+    update depends on the number of new lines and not on the game length.
+
+    The stats are reset when a new game starts ("Team Fortress") or when the
+    user connects to a server.  If a rating store is given, the players
+    start at their career elo and the elo at the end of the game is saved
+    to the store.
+
+    Players that leave the game are pruned from the names, the teams and
+    the per-player stats, so the hot paths only see live players.  Their
+    stats are archived in `departed` and restored if they come back.
+    """
+
+    def __init__(self, user: str, weapon_class: Optional[Dict[str, str]] = None,
+                 weapon_dmg: Optional[Dict[str, str]] = None, ratings=None,
+                 clock: Optional[Callable[[], float]] = time.monotonic):
+        self.user = user
+        # timestamps the events of the sliding window metrics as the lines
+        # are processed
+        self.clock = clock
+        # True while lines written before now are processed, see catch_up
+        self.catching_up = False
+        self.weapon_class = weapon_class if weapon_class is not None else {}
+        self.weapon_dmg = weapon_dmg if weapon_dmg is not None else {}
+        self.ratings = ratings
+        self.names = NameIndex()
+        self.roster = RosterTracker()
+        # the (host, port) of the server the user is connected to
+        self.server: Optional[Tuple[str, int]] = None
+        self.kill_events = EventStore()
+        self._saved_events = 0
+        # counts the resets, so views of the state can tell a new game
+        self.game_id = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        clears the stats of the game.  The known usernames are kept because
+        the other players are still connected.
+        """
+        self.end_game()
+        self.game_id += 1
+        self.kill_events = EventStore()
+        self._saved_events = 0
+        # the number of lines read since the stats were reset
+        self.line_number = 0
+        self.team_tracker = TeamTracker()
+        # the defaults are module level functions so the state can be pickled
+        # for replay checkpoints
+        self.player_elo: Dict[str, float] = (
+            SeededElo(self.ratings.get) if self.ratings else defaultdict(_default_elo))
+        self.killstreaks: Dict[str, List[int]] = defaultdict(_first_life)
+        # the elo of the user after each of their kills and deaths
+        self.elo_history: List[float] = []
+        self.player_kills: Dict[str, int] = defaultdict(int)
+        self.player_deaths: Dict[str, int] = defaultdict(int)
+        self.player_dmg_kills: Dict[str, Dict[str, int]] = defaultdict(_kill_counts)
+        self.player_class: Dict[str, str] = {}
+        self.points: Dict[str, int] = defaultdict(int)
+        self.rivals: Dict[str, int] = defaultdict(int)
+        self.class_deaths: Dict[str, int] = defaultdict(int)
+        self.dmg_type_deaths: Dict[str, int] = defaultdict(int)
+        self.metrics = SlidingWindowMetrics(clock=None if self.catching_up else self.clock)
+        # the archived stats of the players that left, by per-player table
+        self.departed: Dict[str, Dict[str, object]] = {}
+        self.kills = 0
+        self.deaths = 0
+
+    def __getstate__(self):
+        # the weapon tables are shared and the rating store is a database
+        # connection, so they are left out of pickled states and have to be
+        # given back after unpickling
+        state = self.__dict__.copy()
+        state["weapon_class"] = None
+        state["weapon_dmg"] = None
+        state["ratings"] = None
+        return state
+
+    def catch_up(self) -> None:
+        """
+        marks the lines processed until caught_up as a backlog, like the
+        start of the game read when the dashboard starts.  They happened
+        before now, so they are left out of the time window of the metrics.
+        """
+        self.catching_up = True
+        self.metrics.start(None)
+
+    def caught_up(self) -> None:
+        """
+        starts the time window of the metrics after a backlog
+        """
+        if self.catching_up:
+            self.catching_up = False
+            self.metrics.start(self.clock)
+
+    def end_game(self) -> None:
+        """
+        saves the elo of the players to the rating store if there were any
+        kills in the game
+        """
+        if self.ratings and len(self.kill_events) > self._saved_events:
+            ratings = {p: archive["player_elo"] for p, archive in self.departed.items()
+                       if "player_elo" in archive}
+            ratings.update(self.player_elo)
+            self.ratings.save(ratings)
+            self._saved_events = len(self.kill_events)
+
+    def new_game(self) -> None:
+        """
+        clears the stats and usernames when a new game starts
+        """
+        self.names = NameIndex()
+        self.roster = RosterTracker()
+        self.reset()
+
+    def depart(self, player: str) -> None:
+        """
+        archives the stats of a player that left and removes the player from
+        the names, the teams and the per-player stats
+        """
+        if player == self.user:
+            return
+        archive = {table: getattr(self, table).pop(player)
+                   for table in _player_tables if player in getattr(self, table)}
+        if archive:
+            self.departed[player] = archive
+        self.names.discard(player)
+        self.team_tracker.remove_player(player)
+
+    def rejoin(self, player: str) -> None:
+        """
+        restores the archived stats of a player that came back
+        """
+        for table, value in self.departed.pop(player, {}).items():
+            getattr(self, table)[player] = value
+
+    def _seen(self, player: str) -> None:
+        if self.roster.seen(player) and player in self.departed:
+            self.rejoin(player)
+
+    def update_roster(self, roster: FrozenSet[str]) -> None:
+        """
+        updates the players with an A2S roster of the server.  The names in
+        the roster help to split ambiguous lines, and players that are
+        missing from it leave the game.
+        """
+        for player in self.roster.poll(roster):
+            self.depart(player)
+        for player in roster:
+            if player in self.departed:
+                self.rejoin(player)
+        self.names.update(roster)
+
+    def process_lines(self, lines: List[str]) -> None:
+        """
+        updates the game stats with the new lines of the log
+        """
+        for line in lines:
+            self.process_line(line)
+
+    def process_line(self, line: str) -> Optional[Union[LogEvent, GameStartEvent]]:
+        """
+        updates the game stats with a single line of the log and returns the
+        event of the line, if any
+        """
+        self.line_number += 1
+        if line.strip() == "Team Fortress":
+            event: Optional[Union[LogEvent, GameStartEvent]] = GameStartEvent()
+        else:
+            event = classify_line(line, self.names)
+        self.apply_event(event)
+        return event
+
+    def apply_event(self, event: Optional[Union[LogEvent, GameStartEvent]]) -> None:
+        """
+        updates the game stats with an event of the log
+        """
+        if isinstance(event, KillEvent):
+            self.add_kill(event)
+        elif isinstance(event, ObjectiveEvent):
+            self.add_objective(event)
+        elif isinstance(event, ConnectEvent):
+            self.names.add(event.player)
+            self._seen(event.player)
+            if event.player == self.user:
+                self.reset()
+        elif isinstance(event, LeaveEvent):
+            self.roster.leave(event.player)
+            self.depart(event.player)
+        elif isinstance(event, TeamSwitchEvent):
+            self._seen(event.player)
+            self.team_tracker.switch_team(event.player)
+        elif isinstance(event, DeathEvent):
+            self._seen(event.player)
+            self.player_deaths[event.player] += 1
+            self.metrics.add_death(event.player)
+            if event.player == self.user:
+                self.deaths += 1
+        elif isinstance(event, ServerEvent):
+            self.server = event.address
+        elif isinstance(event, GameStartEvent):
+            self.new_game()
+
+    def add_kill(self, kill_event: KillEvent) -> None:
+        """
+        updates the stats with a kill event
+        """
+        killer, victim, weapon = kill_event.killer, kill_event.victim, kill_event.weapon
+        self.kill_events.append(kill_event, self.line_number)
+        self._seen(killer)
+        self._seen(victim)
+        self.team_tracker.add_kill(killer, victim)
+        self.metrics.add_kill(killer, victim)
+
+        k_elo, v_elo = calculate_elo(self.player_elo[killer], self.player_elo[victim])
+        self.player_elo[killer] = k_elo
+        self.player_elo[victim] = v_elo
+        if self.user in (killer, victim):
+            self.elo_history.append(self.player_elo[self.user])
+
+        self.killstreaks[killer][-1] += 1
+        self.killstreaks[victim].append(0)
+        self.player_kills[killer] += 1
+        self.player_deaths[victim] += 1
+        self.points[killer] += 1
+
+        if weapon in self.weapon_dmg:
+            self.player_dmg_kills[killer][self.weapon_dmg[weapon]] += 1
+        if self.weapon_class.get(weapon) not in {None, "many"}:
+            self.player_class[killer] = self.weapon_class[weapon]
+
+        if killer == self.user:
+            self.kills += 1
+        if victim == self.user:
+            self.deaths += 1
+            self.rivals[killer] += 1
+            self.class_deaths[self.weapon_class.get(weapon, "many")] += 1
+            self.dmg_type_deaths[self.weapon_dmg.get(weapon, "melee")] += 1
+
+    def add_objective(self, objective_event: ObjectiveEvent) -> None:
+        """
+        updates the points with a capture or defense event
+        """
+        for player in objective_event.players:
+            self._seen(player)
+            self.points[player] += 1
+
+    def killstreak(self, player: Optional[str] = None) -> int:
+        """
+        returns the current killstreak of the player, or of the user if no
+        player is given
+        """
+        streaks = self.killstreaks.get(self.user if player is None else player)
+        return streaks[-1] if streaks else 0
+
+    def team_kills(self, players) -> int:
+        """
+        returns the number of kills made by the given players
+        """
+        return sum(self.player_kills.get(p, 0) for p in players)
+
+    def team_killtypes(self, players) -> Dict[str, int]:
+        """
+        returns the number of kills of each damage type made by the given
+        players
+        """
+        killtypes = {dt: 0 for dt in damage_types}
+        for p in players:
+            for dt, count in self.player_dmg_kills.get(p, {}).items():
+                killtypes[dt] = killtypes.get(dt, 0) + count
+        return killtypes
@@ -0,0 +1,283 @@
+"""
+Reading the tf2 console log (logs.txt) from disk.
+"""
+
+import json
+import mmap
+import os
+import re
+from typing import Iterator, List, Optional, Tuple
+
+# where tf2 writes the console log on windows with the default steam library
+default_log_path = ("C:\\Program Files (x86)\\Steam\\steamapps\\common\\"
+                    "Team Fortress 2\\tf\\logs.txt")
+
+# a game starts with a "Team Fortress" line followed by a "Map:" line.  The
+# logs can have windows or unix line endings whatever the current os is.
+game_start_re = re.compile(rb"\nTeam Fortress\r?\nMap:")
+fallback_start_re = re.compile(rb"\nTeam Fortress\r?\n")
+
+
+def decode_lines(data: bytes) -> List[str]:
+    """
+    decodes the lines of a block of the log that ends at a line end
+    """
+    text = data.decode("utf-8", errors="replace")
+    lines = [l[:-1] if l.endswith("\r") else l for l in text.split("\n")]
+    return lines[:-1] if lines and not lines[-1] else lines
+
+
+def latest_game_offset(path: str, block_size: int = 100_000) -> Optional[int]:
+    """
+    returns the byte offset where the most recent or in progress game starts
+    in the tf2 log file.  If there is not a game in the file, it returns none.
+
+    The file is searched backwards one block at a time, so only the bytes
+    after the start of the latest game are read.
+    """
+    size = os.path.getsize(path)
+    fallback: Optional[int] = None
+    with open(path, "rb") as f:
+        end = size
+        while end > 0:
+            start = max(0, end - block_size)
+            # the block is read with the byte before it and the bytes of a
+            # game start that crosses its end.  The start of the file counts
+            # as a line end.
+            read_start = max(0, start - 1)
+            f.seek(read_start)
+            block = f.read(end - read_start + 32)
+            if start == 0:
+                block = b"\n" + block
+                read_start = -1
+
+            matches = list(game_start_re.finditer(block))
+            if matches:
+                return read_start + matches[-1].start() + 1
+            if fallback is None:
+                matches = list(fallback_start_re.finditer(block))
+                if matches:
+                    fallback = read_start + matches[-1].start() + 1
+            end = start
+    return fallback
+
+
+def read_latest_game(path: str) -> Optional[List[str]]:
+    """
+    Reads the tf2 log file from the given path and returns the lines for the
+    most recent or in progress game.  If there is not a game in the file, it
+    returns none.
+    """
+    offset = latest_game_offset(path)
+    if offset is None:
+        return None
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return decode_lines(f.read())
+
+
+def iter_game_ranges(path: str) -> Iterator[Tuple[int, int]]:
+    """
+    yields the (start, end) byte range of every game in the log file while
+    reading it line by line.  A game starts at a "Team Fortress" line that
+    is followed by a "Map:" line.  The lines before the first game are
+    yielded as a game of their own.
+    """
+    start = 0
+    offset = 0
+    game_offset: Optional[int] = None
+    with open(path, "rb") as f:
+        for line in f:
+            if game_offset is not None and line.startswith(b"Map:"):
+                if game_offset > start:
+                    yield (start, game_offset)
+                start = game_offset
+            game_offset = offset if line.rstrip(b"\r\n") == b"Team Fortress" else None
+            offset += len(line)
+    if offset > start:
+        yield (start, offset)
+
+
+def read_range(path: str, start: int, end: int) -> List[str]:
+    """
+    reads the lines between the start and end byte offsets of the log file
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        return decode_lines(f.read(end - start))
+
+
+class GameIndex:
+    """
+    The byte offset of every game start in the log file, kept in a sidecar
+    file next to the log ({log}.idx by default).  The index is built with
+    one memory mapped scan and update only scans the bytes appended since
+    the last scan, so opening any game is one seek and one bounded read.
+
+    If the log file was replaced or rewritten, the index is rebuilt.
+    """
+
+    def __init__(self, log_path: str, index_path: Optional[str] = None):
+        self.log_path = log_path
+        self.index_path = index_path if index_path else log_path + ".idx"
+        self.offsets: List[int] = []
+        # the number of bytes of the log that have been scanned
+        self.scanned = 0
+        self.file_id: Optional[Tuple[int, int]] = None
+        self.head = ""
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.offsets = data["offsets"]
+        self.scanned = data["scanned"]
+        self.file_id = tuple(data["file_id"])
+        self.head = data["head"]
+
+    def _save(self) -> None:
+        data = {"offsets": self.offsets, "scanned": self.scanned,
+                "file_id": self.file_id, "head": self.head}
+        try:
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        except OSError:
+            # the index is only a cache, so the log can still be read
+            # without it
+            pass
+
+    def _read_head(self) -> str:
+        with open(self.log_path, "rb") as f:
+            return f.read(64).hex()
+
+    def update(self) -> None:
+        """
+        adds the games that were written to the log since the last update
+        """
+        st = os.stat(self.log_path)
+        file_id = (st.st_dev, st.st_ino)
+        head = self._read_head()
+        if file_id != self.file_id or st.st_size < self.scanned or head[:len(self.head)] != self.head:
+            self.offsets = []
+            self.scanned = 0
+        self.file_id = file_id
+        self.head = head
+        if st.st_size == self.scanned:
+            return
+
+        with open(self.log_path, "rb") as f, \
+             mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if self.scanned == 0 and game_start_re.match(b"\n" + mm[:32]):
+                self.offsets.append(0)
+            # a game start can cross the end of the previous scan
+            pos = max(0, self.scanned - 32)
+            last = self.offsets[-1] if self.offsets else -1
+            for match in game_start_re.finditer(mm, pos):
+                offset = match.start() + 1
+                if offset > last:
+                    self.offsets.append(offset)
+                    last = offset
+            self.scanned = len(mm)
+        self._save()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def game_range(self, n: int) -> Tuple[int, int]:
+        """
+        returns the (start, end) byte range of game n.  Negative numbers
+        count from the latest game.
+        """
+        start = self.offsets[n]
+        n = n % len(self.offsets)
+        end = self.offsets[n + 1] if n + 1 < len(self.offsets) else self.scanned
+        return (start, end)
+
+    def read_game(self, n: int = -1) -> List[str]:
+        """
+        returns the lines of game n, by default the latest game
+        """
+        start, end = self.game_range(n)
+        return read_range(self.log_path, start, end)
+
+
+class LogFollower:
+    """
+    Follows a growing log file by remembering the byte offset it has read up
+    to.  Each call to read_lines only reads the bytes appended since the last
+    call.  A trailing line without a newline is held back until it is
+    complete.
+
+    tf2 rewrites logs.txt when the game restarts.  If the file is replaced or
+    shrinks below the remembered offset, the follower starts over from the
+    beginning of the new file and increments `rotations`.
+    """
+
+    def __init__(self, path: str, offset: int = 0, encoding: str = "utf-8"):
+        self.path = path
+        self.offset = offset
+        self.encoding = encoding
+        self.file_id: Optional[Tuple[int, int]] = None
+        self.rotations = 0
+        self._partial = b""
+        # the last bytes read before line_offset, at most 64
+        self.tail = b""
+
+    @property
+    def line_offset(self) -> int:
+        """
+        the offset of the end of the last complete line that was read
+        """
+        return self.offset - len(self._partial)
+
+    def seek_end(self) -> None:
+        """
+        skips everything currently in the file so only lines written after
+        this call are returned.
+        """
+        st = os.stat(self.path)
+        self.file_id = (st.st_dev, st.st_ino)
+        self.offset = st.st_size
+        self._partial = b""
+        self.tail = b""
+
+    def read_lines(self) -> List[str]:
+        """
+        returns the complete lines appended to the file since the last call.
+        Returns an empty list if the file does not exist or has not grown.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+
+        file_id = (st.st_dev, st.st_ino)
+        replaced = self.file_id is not None and self.file_id != file_id
+        if replaced or st.st_size < self.offset:
+            self.offset = 0
+            self._partial = b""
+            self.tail = b""
+            self.rotations += 1
+        self.file_id = file_id
+
+        if st.st_size == self.offset:
+            return []
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        self.offset += len(data)
+
+        data = self._partial + data
+        end = data.rfind(b"\n")
+        if end < 0:
+            self._partial = data
+            return []
+        self._partial = data[end + 1:]
+        self.tail = (self.tail + data[:end + 1])[-64:]
+
+        text = data[:end].decode(self.encoding, errors="replace")
+        return [l[:-1] if l.endswith("\r") else l for l in text.split("\n")]
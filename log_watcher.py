@@ -0,0 +1,173 @@
+"""
+Follows several tf2 logs in one process with asyncio, each with its own
+user and game state.
+
+    python log_watcher.py watched_logs.json
+
+The config file is a json list of {"name": ..., "log": ..., "user": ...}
+objects.  The weapon tables, the compiled line patterns and the server
+roster poller are loaded once and shared by every log.
+"""
+
+import argparse
+import asyncio
+import json
+import traceback
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from dashboard_model import Snapshot, build_snapshot, indexed_game_offset
+from log_parsing import GameState
+from log_reader import LogFollower
+from roster_poller import RosterPoller
+from weapons import load_weapons
+
+WatchedLog = NamedTuple("WatchedLog", [("name", str),
+                                       ("log_path", str),
+                                       ("user", str)])
+
+
+def read_config(path: str) -> List[WatchedLog]:
+    """
+    reads the logs to watch from a json config file
+    """
+    with open(path, encoding="utf-8") as f:
+        return [WatchedLog(entry["name"], entry["log"], entry["user"])
+                for entry in json.load(f)]
+
+
+class LogWatch:
+    """
+    The follower and game state of one watched log.  Each poll only reads
+    the bytes appended since the last one, and a snapshot is only built
+    when there were new lines.
+    """
+
+    def __init__(self, watched: WatchedLog, weapon_class: Dict[str, str],
+                 weapon_dmg: Dict[str, str], roster_poller: RosterPoller):
+        self.watched = watched
+        self.roster_poller = roster_poller
+        self.game_state = GameState(watched.user, weapon_class, weapon_dmg)
+        # the first poll reads the game so far
+        self.game_state.catch_up()
+        self.follower: Optional[LogFollower] = None
+        self.snapshot: Optional[Snapshot] = None
+
+    def read_lines(self) -> Tuple[bool, List[str]]:
+        """
+        returns whether the log was rotated and the new lines of the log.
+        This does the file io, so it runs in the executor.
+        """
+        if self.follower is None:
+            self.follower = LogFollower(self.watched.log_path,
+                                        indexed_game_offset(self.watched.log_path))
+        rotations = self.follower.rotations
+        lines = self.follower.read_lines()
+        return (self.follower.rotations != rotations, lines)
+
+    def process(self, rotated: bool, lines: List[str]) -> Optional[Snapshot]:
+        """
+        applies the lines to the game state and returns the new snapshot, or
+        None if it did not change
+        """
+        if not lines and not rotated and self.snapshot is not None:
+            return None
+        state = self.game_state
+        if rotated:
+            state.new_game()
+        state.process_lines(lines)
+        state.caught_up()
+        if state.server:
+            self.roster_poller.request(state.server)
+            state.update_roster(self.roster_poller.roster(state.server))
+        snapshot = build_snapshot(state)
+        if snapshot == self.snapshot:
+            return None
+        self.snapshot = snapshot
+        return snapshot
+
+
+class MultiLogWatcher:
+    """
+    Polls every watched log every `interval` seconds on one event loop and
+    calls on_snapshot with the name of the log and its new snapshot.
+    """
+
+    def __init__(self, weapon_class: Dict[str, str], weapon_dmg: Dict[str, str],
+                 on_snapshot: Callable[[str, Snapshot], None],
+                 interval: float = 0.5,
+                 roster_poller: Optional[RosterPoller] = None):
+        self.weapon_class = weapon_class
+        self.weapon_dmg = weapon_dmg
+        self.on_snapshot = on_snapshot
+        self.interval = interval
+        self.roster_poller = roster_poller if roster_poller else RosterPoller()
+        self.watches: Dict[str, LogWatch] = {}
+        self._stop_event: Optional[asyncio.Event] = None
+
+    def add(self, watched: WatchedLog) -> LogWatch:
+        watch = LogWatch(watched, self.weapon_class, self.weapon_dmg, self.roster_poller)
+        self.watches[watched.name] = watch
+        return watch
+
+    async def poll(self, watch: LogWatch) -> None:
+        """
+        reads and processes the new lines of one log
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            rotated, lines = await loop.run_in_executor(None, watch.read_lines)
+            snapshot = watch.process(rotated, lines)
+        except OSError as e:
+            print(watch.watched.name, e)
+            return
+        except Exception: # pylint: disable=broad-except
+            # an error in one log must not end the gather of the others or
+            # the polling loop
+            print(watch.watched.name, "failed")
+            traceback.print_exc()
+            return
+        if snapshot:
+            self.on_snapshot(watch.watched.name, snapshot)
+
+    async def run(self) -> None:
+        """
+        polls the logs until stop is called
+        """
+        self._stop_event = asyncio.Event()
+        while not self._stop_event.is_set():
+            await asyncio.gather(*(self.poll(w) for w in list(self.watches.values())))
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self) -> None:
+        if self._stop_event:
+            self._stop_event.set()
+
+
+def print_snapshot(name: str, snapshot: Snapshot) -> None:
+    print(f"{name}: {snapshot.user} {snapshot.kills}/{snapshot.deaths} "
+          f"streak {snapshot.streak} elo {int(snapshot.elo)}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("config", help="json list of the logs to watch")
+    parser.add_argument("--weapons", default="tf2_weapons.db", help="weapon database")
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="seconds between polls of each log")
+    args = parser.parse_args(argv)
+
+    weapon_class, weapon_dmg = load_weapons(args.weapons)
+    watcher = MultiLogWatcher(weapon_class, weapon_dmg, print_snapshot, args.interval)
+    for watched in read_config(args.config):
+        watcher.add(watched)
+    try:
+        asyncio.run(watcher.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Keeps the elo of every player across games in a sqlite database, so a
+player starts a game at their career rating instead of 1600.
+"""
+
+import sqlite3
+from collections import OrderedDict
+from typing import Dict
+
+
+class RatingStore:
+    """
+    The career ratings of the players.  Ratings are read through an LRU
+    cache of `cache_size` players, so repeated lookups during a game do not
+    touch the disk.  The ratings at the end of a game are written in one
+    transaction with save.
+    """
+
+    def __init__(self, db_path: str = "tf2_ratings.db", cache_size: int = 1024,
+                 default: float = 1600.0):
+        # the ratings are used from the compute worker thread
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("create table if not exists rating "
+                          "(name text primary key, elo real, games integer)")
+        self.conn.commit()
+        self.cache_size = cache_size
+        self.default = default
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+
+    def _remember(self, name: str, elo: float) -> None:
+        self._cache[name] = elo
+        self._cache.move_to_end(name)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, name: str) -> float:
+        """
+        returns the career rating of the player, or the default rating for a
+        new player
+        """
+        if name in self._cache:
+            self._cache.move_to_end(name)
+            return self._cache[name]
+        row = self.conn.execute("select elo from rating where name = ?", (name,)).fetchone()
+        elo = row[0] if row else self.default
+        self._remember(name, elo)
+        return elo
+
+    def save(self, ratings: Dict[str, float]) -> None:
+        """
+        stores the ratings of the players at the end of a game
+        """
+        with self.conn:
+            self.conn.executemany(
+                "insert into rating values (?, ?, 1) on conflict(name) do update "
+                "set elo = excluded.elo, games = games + 1",
+                ratings.items())
+        for name, elo in ratings.items():
+            self._remember(name, elo)
+
+    def close(self) -> None:
+        self.conn.close()
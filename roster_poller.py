@@ -0,0 +1,109 @@
+"""
+Polls the player list of tf2 servers in the background so the gui never
+waits on the network.
+"""
+
+import socket
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, Optional, Set, Tuple
+
+Address = Tuple[str, int]
+
+
+def a2s_players(address: Address, timeout: float) -> Set[str]:
+    """
+    queries the server with A2S_PLAYER and returns the usernames of the
+    connected players
+    """
+    import a2s # type: ignore #pylint: disable=import-outside-toplevel
+    return {p.name for p in a2s.players(address, timeout=timeout)}
+
+
+class RosterPoller:
+    """
+    Keeps a cached roster for each server.  request starts a query in a
+    background thread when the cached roster is older than `ttl` seconds,
+    and roster returns the latest cached roster without blocking.
+
+    There is at most one query in flight per (host, port).  A server that
+    times out or fails to answer, or a query that cannot run because a2s is
+    missing, is retried after a backoff that doubles with each failure, up
+    to `max_backoff` seconds.
+    """
+
+    def __init__(self, ttl: float = 30.0, timeout: float = 3.0,
+                 max_backoff: float = 300.0,
+                 query: Callable[[Address, float], Set[str]] = a2s_players):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self._query = query
+        self._lock = threading.Lock()
+        self._rosters: Dict[Address, FrozenSet[str]] = {}
+        self._updated: Dict[Address, float] = {}
+        self._failures: Dict[Address, int] = {}
+        self._retry_at: Dict[Address, float] = {}
+        self._in_flight: Dict[Address, threading.Thread] = {}
+
+    def request(self, address: Address) -> bool:
+        """
+        starts a background query of the server unless its roster is fresh,
+        it is backing off after a timeout, or a query is already running.
+        Returns True if a query was started.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if address in self._in_flight:
+                return False
+            if now < self._retry_at.get(address, 0.0):
+                return False
+            if now - self._updated.get(address, -self.ttl) < self.ttl:
+                return False
+            thread = threading.Thread(target=self._poll, args=(address,),
+                                      daemon=True)
+            self._in_flight[address] = thread
+        thread.start()
+        return True
+
+    def roster(self, address: Optional[Address]) -> FrozenSet[str]:
+        """
+        returns the latest roster of the server, or an empty set if it has
+        not been queried yet
+        """
+        with self._lock:
+            return self._rosters.get(address, frozenset()) if address else frozenset()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        waits for the running queries to finish
+        """
+        with self._lock:
+            threads = list(self._in_flight.values())
+        for thread in threads:
+            thread.join(timeout)
+
+    def _poll(self, address: Address) -> None:
+        try:
+            names = frozenset(self._query(address, self.timeout))
+        except Exception as e: # pylint: disable=broad-except
+            # a2s raises its own errors for malformed replies, and is only
+            # imported by the first query
+            with self._lock:
+                failures = self._failures.get(address, 0) + 1
+                self._failures[address] = failures
+                backoff = min(self.max_backoff, self.timeout * 2 ** failures)
+                self._retry_at[address] = time.monotonic() + backoff
+            if isinstance(e, socket.timeout):
+                print("tf2 server connection timeout")
+            else:
+                print(f"tf2 server query failed: {e!r}")
+        else:
+            with self._lock:
+                self._rosters[address] = names
+                self._updated[address] = time.monotonic()
+                self._failures.pop(address, None)
+                self._retry_at.pop(address, None)
+        finally:
+            with self._lock:
+                del self._in_flight[address]
@@ -0,0 +1,65 @@
+"""
+Tracks which players are still on the server.  The log says when players
+connect and sometimes when they leave, but players that time out or crash
+leave no line, so the A2S rosters of the server are used to notice them.
+"""
+
+from typing import Dict, FrozenSet, List, Optional, Set
+
+LIVE = "live"
+LEFT = "left"
+
+
+class RosterTracker:
+    """
+    A state machine of every player seen in the game.  Players are live
+    from their first connect line or event until a leave line, or until they
+    are missing from two A2S rosters in a row without an event of theirs
+    in between.
+    """
+
+    def __init__(self):
+        self.states: Dict[str, str] = {}
+        # the live players missing from the last roster
+        self._missing: Set[str] = set()
+        self._last_roster: Optional[FrozenSet[str]] = None
+
+    def seen(self, player: str) -> bool:
+        """
+        marks the player live.  Returns True if the player was not live.
+        """
+        self._missing.discard(player)
+        if self.states.get(player) == LIVE:
+            return False
+        self.states[player] = LIVE
+        return True
+
+    def leave(self, player: str) -> bool:
+        """
+        marks the player as left.  Returns True if the player was live.
+        """
+        self._missing.discard(player)
+        was_live = self.states.get(player) == LIVE
+        self.states[player] = LEFT
+        return was_live
+
+    def live(self) -> Set[str]:
+        return {p for p, state in self.states.items() if state == LIVE}
+
+    def poll(self, roster: FrozenSet[str]) -> List[str]:
+        """
+        updates the states with an A2S roster and returns the players that
+        left without a leave line.  The same roster is only counted once.
+        """
+        if not roster or roster is self._last_roster:
+            return []
+        self._last_roster = roster
+        for player in roster:
+            self.seen(player)
+        missing = {p for p, state in self.states.items()
+                   if state == LIVE and p not in roster}
+        departed = sorted(missing & self._missing)
+        for player in departed:
+            self.leave(player)
+        self._missing = missing - set(departed)
+        return departed
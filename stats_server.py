@@ -0,0 +1,239 @@
+"""
+Serves the dashboard snapshots over local http so stream overlays and other
+viewers can follow the game without their own copy of the pipeline.
+
+    GET /snapshot   the latest snapshot as json
+    GET /events     a server-sent events stream of the snapshot.  The first
+                    "snapshot" event holds the whole snapshot and each
+                    "delta" event holds only the fields that changed.
+
+Each snapshot is encoded once however many viewers are connected.  Viewers
+get their events through bounded queues, so a slow viewer never blocks the
+compute worker.  When a viewer's queue is full, its pending events are
+dropped and it is sent the whole snapshot again.
+
+    python stats_server.py [--port PORT] [--log LOG] [--user USER_FILE]
+"""
+
+import argparse
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set
+
+from dashboard_model import ComputeWorker, Snapshot
+from log_reader import default_log_path
+from rating_store import RatingStore
+from weapons import load_weapons
+
+
+def snapshot_json(snapshot: Snapshot) -> Dict[str, Any]:
+    """
+    returns the snapshot as a json compatible dictionary
+    """
+    def convert(value):
+        if hasattr(value, "_asdict"):
+            return {k: convert(v) for k, v in value._asdict().items()}
+        if isinstance(value, tuple):
+            return [convert(v) for v in value]
+        return value
+
+    fields = convert(snapshot)
+    # the kill types are (damage type, kills) pairs in the snapshot
+    fields["ally_killtypes"] = dict(snapshot.ally_killtypes)
+    fields["enemy_killtypes"] = dict(snapshot.enemy_killtypes)
+    return fields
+
+
+def snapshot_delta(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    returns the fields of the new snapshot that differ from the old one
+    """
+    return {k: v for k, v in new.items() if old.get(k) != v}
+
+
+def sse_event(event: str, version: int, data: Dict[str, Any]) -> bytes:
+    return f"id: {version}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class StatsBroadcaster:
+    """
+    Keeps the latest snapshot and fans the encoded events out to the queues
+    of the connected viewers.
+    """
+
+    def __init__(self, max_pending: int = 16):
+        self.max_pending = max_pending
+        self.version = 0
+        self.resyncs = 0
+        self._fields: Dict[str, Any] = {}
+        self._snapshot_event = b""
+        self._clients: Set["queue.Queue[bytes]"] = set()
+        self._lock = threading.Lock()
+
+    def publish(self, snapshot: Snapshot) -> None:
+        """
+        encodes the snapshot and its delta once and queues the delta for
+        every viewer without blocking
+        """
+        fields = snapshot_json(snapshot)
+        with self._lock:
+            delta = snapshot_delta(self._fields, fields)
+            if not delta:
+                return
+            self.version += 1
+            self._fields = fields
+            self._snapshot_event = sse_event("snapshot", self.version, fields)
+            delta_event = sse_event("delta", self.version, delta)
+            for client in self._clients:
+                try:
+                    client.put_nowait(delta_event)
+                except queue.Full:
+                    self._resync(client)
+
+    def _resync(self, client: "queue.Queue[bytes]") -> None:
+        # the viewer fell behind, so the deltas it missed are replaced with
+        # the whole snapshot
+        self.resyncs += 1
+        while True:
+            try:
+                client.get_nowait()
+            except queue.Empty:
+                break
+        client.put_nowait(self._snapshot_event)
+
+    def connect(self) -> "queue.Queue[bytes]":
+        """
+        returns the event queue of a new viewer, starting with the whole
+        snapshot if there is one
+        """
+        client: "queue.Queue[bytes]" = queue.Queue(maxsize=self.max_pending)
+        with self._lock:
+            if self._snapshot_event:
+                client.put_nowait(self._snapshot_event)
+            self._clients.add(client)
+        return client
+
+    def disconnect(self, client: "queue.Queue[bytes]") -> None:
+        with self._lock:
+            self._clients.discard(client)
+
+    def latest(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._fields
+
+    def viewers(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+
+class StatsRequestHandler(BaseHTTPRequestHandler):
+    # set on the subclass made by StatsServer
+    broadcaster: StatsBroadcaster
+    keepalive = 15.0
+
+    def do_GET(self) -> None: #pylint: disable=invalid-name
+        if self.path == "/snapshot":
+            body = json.dumps(self.broadcaster.latest()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/events":
+            self.stream_events()
+        else:
+            self.send_error(404)
+
+    def stream_events(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        client = self.broadcaster.connect()
+        try:
+            while not self.server.stopping: # type: ignore
+                try:
+                    event = client.get(timeout=self.keepalive)
+                except queue.Empty:
+                    # a comment keeps proxies from closing the idle stream
+                    event = b": keepalive\n\n"
+                self.wfile.write(event)
+                self.wfile.flush()
+        except ConnectionError:
+            # the viewer closed the stream.  Windows raises
+            # ConnectionAbortedError, the others broken pipe or reset
+            pass
+        finally:
+            self.broadcaster.disconnect(client)
+
+    def log_message(self, format, *args) -> None: #pylint: disable=redefined-builtin
+        pass
+
+
+class StatsServer:
+    """
+    An http server in a background thread that serves the snapshots given
+    to publish.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765,
+                 max_pending: int = 16, keepalive: float = 15.0):
+        self.broadcaster = StatsBroadcaster(max_pending)
+        handler = type("Handler", (StatsRequestHandler,),
+                       {"broadcaster": self.broadcaster, "keepalive": keepalive})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stopping = False # type: ignore
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    def publish(self, snapshot: Snapshot) -> None:
+        self.broadcaster.publish(snapshot)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.httpd.stopping = True # type: ignore
+        # shutdown waits for serve_forever to return, so it would block
+        # forever if the server was never started
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread = None
+        self.httpd.server_close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serves the tf2 stats without the gui")
+    parser.add_argument("--log", default=default_log_path, help="path to logs.txt")
+    parser.add_argument("--user", default="tf2_user.txt",
+                        help="file containing the username of the player")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    server = StatsServer(args.host, args.port)
+    weapon_class, weapon_dmg = load_weapons("tf2_weapons.db")
+    worker = ComputeWorker(args.log, args.user, weapon_class, weapon_dmg,
+                           ratings=RatingStore("tf2_ratings.db"),
+                           on_snapshot=server.publish)
+    server.start()
+    print(f"serving on http://{args.host}:{args.port}/events")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Generates deterministic synthetic tf2 console logs for tests and benchmarks.
+"""
+
+import random
+from typing import Iterator, List, NamedTuple
+
+weapons = ["scattergun.", "tf_projectile_rocket.", "tf_projectile_pipe.",
+           "minigun.", "knife.", "sniperrifle.", "flamethrower.", "shotgun_primary.",
+           "sentrygun.", "world."]
+
+LogOptions = NamedTuple("LogOptions", [("players", int),
+                                       ("games", int),
+                                       ("kills_per_game", int),
+                                       ("ambiguous_names", int),
+                                       ("crit_ratio", float),
+                                       ("objectives_per_game", int),
+                                       ("team_switches", int),
+                                       ("seed", int)])
+
+
+def log_options(players: int = 24, games: int = 1, kills_per_game: int = 1000,
+                ambiguous_names: int = 2, crit_ratio: float = 0.1,
+                objectives_per_game: int = 20, team_switches: int = 2,
+                seed: int = 0) -> LogOptions:
+    """
+    returns the log options with defaults for the ones not given
+    """
+    return LogOptions(players, games, kills_per_game, ambiguous_names, crit_ratio,
+                      objectives_per_game, team_switches, seed)
+
+
+def player_names(options: LogOptions) -> List[str]:
+    """
+    returns the player names of the log.  Half of the ambiguous names
+    contain " killed " and the other half ", ".
+    """
+    names = [f"player{i}" for i in range(options.players - options.ambiguous_names)]
+    for i in range(options.ambiguous_names):
+        if i % 2 == 0:
+            names.append(f"{names[i % len(names)]} killed {i}")
+        else:
+            names.append(f"joke, {i}")
+    return names
+
+
+def generate_lines(options: LogOptions) -> Iterator[str]:
+    """
+    yields the lines of the log.  Each game has the players connect, then
+    kills between the two teams mixed with objective events, suicides and
+    autobalance team switches.
+    """
+    rng = random.Random(options.seed)
+    names = player_names(options)
+    for game in range(options.games):
+        yield "Team Fortress"
+        yield f"Map: cp_synthetic_{game}"
+        yield f"Connected to 10.0.0.{game % 250 + 1}:27015"
+        teams = [names[0::2], names[1::2]]
+        for name in names:
+            yield f"{name} connected"
+
+        events = options.kills_per_game + options.objectives_per_game + options.team_switches
+        objective_at = set(rng.sample(range(events), options.objectives_per_game))
+        switch_at = set(rng.sample(sorted(set(range(events)) - objective_at),
+                                   options.team_switches))
+        for i in range(events):
+            if i in objective_at:
+                team = rng.randrange(2)
+                cappers = rng.sample(teams[team], min(3, len(teams[team])))
+                yield f"{', '.join(cappers)} captured point {i} for team #{team + 2} "
+            elif i in switch_at:
+                big = 0 if len(teams[0]) > len(teams[1]) else 1
+                player = teams[big].pop(rng.randrange(len(teams[big])))
+                teams[1 - big].append(player)
+                yield f"{player} was moved to the other team for game balance"
+            elif rng.random() < 0.02:
+                yield f"{rng.choice(names)} died."
+            else:
+                team = rng.randrange(2)
+                killer = rng.choice(teams[team])
+                victim = rng.choice(teams[1 - team])
+                crit = " (crit)" if rng.random() < options.crit_ratio else ""
+                yield f"{killer} killed {victim} with {rng.choice(weapons)}{crit}"
+
+
+def write_log(path: str, options: LogOptions, line_ending: str = "\r\n") -> None:
+    """
+    writes the generated log to the path with windows line endings by
+    default, like tf2 does
+    """
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for line in generate_lines(options):
+            f.write(line + line_ending)
@@ -1,5 +1,38 @@
+import importlib.util
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import urllib.request
 import unittest
 from log_parsing import *
+from log_reader import GameIndex, LogFollower, latest_game_offset, read_latest_game
+from roster_poller import RosterPoller
+from dashboard_model import ComputeWorker, build_snapshot
+from view_model import ViewModel
+from log_watcher import MultiLogWatcher, WatchedLog
+from stats_server import StatsBroadcaster, StatsServer
+import batch_analyzer
+from rating_store import RatingStore
+from elo_replay import EloReplay, replay_games
+import tf2_weapon_categorizer
+from game_replay import GameReplay
+from event_cache import EventCache
+from live_metrics import SlidingWindowMetrics
+from tick_profiler import TickProfiler, percentile
+from tk_chart import LineChart
+from synthetic_logs import generate_lines, log_options, player_names
 
 
 d1 = [
@@ -37,11 +70,990 @@ class TestStringMethods(unittest.TestCase):
         names = {"foo", "bar", "foo bar"}
         for q, a in zip(d2, d2a):
             self.assertEqual(parse_objective_line(q, names), a)
- 
-        
-        
 
 
+class TestLogFollower(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, data, mode="ab"):
+        with open(self.path, mode) as f:
+            f.write(data)
+
+    def test_new_lines(self):
+        follower = LogFollower(self.path)
+        self.write(b"foo connected\r\nfoo killed bar with baz.\r\nbar kil")
+        self.assertEqual(["foo connected", "foo killed bar with baz."],
+                         follower.read_lines())
+        self.assertEqual([], follower.read_lines())
+        self.write(b"led foo with haz.\r\n")
+        self.assertEqual(["bar killed foo with haz."], follower.read_lines())
+
+    def test_truncation(self):
+        follower = LogFollower(self.path)
+        self.write(b"foo connected\nfoo killed bar with baz.\n")
+        follower.read_lines()
+        self.write(b"Team Fortress\n", mode="wb")
+        self.assertEqual(["Team Fortress"], follower.read_lines())
+        self.assertEqual(1, follower.rotations)
+
+    def test_latest_game(self):
+        sep = os.linesep.encode()
+        self.write(sep.join([b"Team Fortress", b"Map: a", b"foo connected",
+                             b"Team Fortress", b"Map: b", b"bar connected"]))
+        lines = read_latest_game(self.path)
+        self.assertEqual(["Team Fortress", "Map: b", "bar connected"], lines)
+
+    def test_game_index(self):
+        game = b"Team Fortress\r\nMap: a\r\nfoo connected\r\n"
+        self.write(game * 2)
+        self.assertEqual(len(game), latest_game_offset(self.path, block_size=7))
+
+        index = GameIndex(self.path)
+        index.update()
+        self.assertEqual([0, len(game)], index.offsets)
+        self.write(b"Team Fortress\r\nMa")
+        index.update()
+        self.write(b"p: b\r\nbar connected\r\n")
+        index.update()
+        self.assertEqual(["Team Fortress", "Map: b", "bar connected"], index.read_game())
+        self.assertEqual(["Team Fortress", "Map: a", "foo connected"], index.read_game(1))
+
+        reloaded = GameIndex(self.path)
+        self.assertEqual(index.offsets, reloaded.offsets)
+        self.write(b"foo connected\n", mode="wb")
+        reloaded.update()
+        self.assertEqual([], reloaded.offsets)
+        os.remove(index.index_path)
+
+
+class TestGameState(unittest.TestCase):
+
+    def test_game_id(self):
+        state = GameState("foo", {}, {"baz.": "melee"})
+        state.process_lines(["foo connected", "bar connected"] + d1)
+        first = build_snapshot(state)
+        state.process_lines(["Team Fortress", "Map: cp_badlands"])
+        # the dashboard clears its charts when the game changes
+        self.assertNotEqual(first.game_id, build_snapshot(state).game_id)
+        self.assertEqual((), build_snapshot(state).elo_history)
+
+    def test_matches_batch(self):
+        names = {"foo", "bar"}
+        state = GameState("foo", {"baz.": "spy"}, {"baz.": "melee"})
+        state.process_lines(["foo connected", "bar connected"] + d1)
+        kill_events = [parse_kill_line(l, names) for l in d1]
+
+        self.assertEqual(get_killstreak("foo", kill_events), state.killstreak())
+        self.assertEqual(get_killstreaks(kill_events)["foo"], state.killstreaks["foo"])
+        self.assertEqual(explained_points(d1, names), state.points)
+        self.assertEqual((4, 1), (state.kills, state.deaths))
+        self.assertEqual({"bar": 1}, state.rivals)
+        self.assertEqual(1, state.team_killtypes({"foo"})["melee"])
+        self.assertEqual("spy", state.player_class["foo"])
+
+        elo = {"foo": 1600.0, "bar": 1600.0}
+        for ke in kill_events:
+            elo[ke.killer], elo[ke.victim] = calculate_elo(elo[ke.killer], elo[ke.victim])
+        self.assertEqual(elo, state.player_elo)
+
+    def test_reset(self):
+        state = GameState("foo")
+        state.process_lines(["bar connected"] + d1)
+        state.process_line("foo connected")
+        self.assertEqual((0, 0), (len(state.kill_events), state.kills))
+        self.assertEqual({"foo", "bar"}, set(state.names))
+        state.process_line("Team Fortress")
+        self.assertEqual(0, len(state.names))
+
+
+class TestClassifyLine(unittest.TestCase):
+
+    def test_events(self):
+        names = {"foo", "bar"}
+        self.assertEqual(KillEvent("foo", "bar", "baz.", False),
+                         classify_line("foo killed bar with baz.", names))
+        self.assertEqual(KillEvent("foo", "bar", "baz.", True),
+                         classify_line("foo killed bar with baz. (crit)", names))
+        self.assertEqual(ObjectiveEvent({"foo", "bar"}, "house", "blue"),
+                         classify_line(d2[0], names))
+        self.assertEqual(ConnectEvent("foo"), classify_line("foo connected", names))
+        self.assertEqual(["foo connected", "foo killed bar with baz."], latest_game_lines(
+            ["bar connected", "foo connected", "foo killed bar with baz."], "foo"))
+        self.assertEqual(DeathEvent("foo", "died"), classify_line("foo died.", names))
+        self.assertEqual(DeathEvent("foo", "suicided"), classify_line("foo suicided.", names))
+        self.assertEqual(TeamSwitchEvent("foo"), classify_line(
+            "foo was moved to the other team for game balance", names))
+        self.assertEqual(LeaveEvent("foo", "disconnected by user"), classify_line(
+            "foo left the game (disconnected by user).", names))
+        self.assertEqual(ServerEvent(("10.0.0.1", 27015)),
+                         classify_line("Connected to 10.0.0.1:27015", names))
+        self.assertIsNone(classify_line("Map: cp_badlands", names))
+
+
+class TestNameIndex(unittest.TestCase):
+
+    def test_ambiguous_names(self):
+        names = NameIndex({"foo", "foo killed bar", "bar", "a, b", "a"})
+        self.assertEqual(KillEvent("foo killed bar", "foo", "baz.", False),
+                         parse_kill_line("foo killed bar killed foo with baz.", names))
+        self.assertEqual(ObjectiveEvent({"a, b", "foo"}, "house", "red"),
+                         parse_objective_line("a, b, foo captured house for team #2 ", names))
+        names.discard("foo killed bar")
+        self.assertIsNone(parse_kill_line("foo killed bar killed foo with baz.", names))
+        names.add("foo killed bar")
+        self.assertEqual(5, len(names))
+
+
+class TestTeamTracker(unittest.TestCase):
+
+    def test_teams(self):
+        names = {"foo", "bar"}
+        kill_events = [parse_kill_line(l, names) for l in d1]
+        self.assertEqual(({"foo"}, {"bar"}), get_teams("foo", kill_events))
+        self.assertEqual(({"baz"}, set()), get_teams("baz", kill_events))
+
+    def test_team_switch(self):
+        tracker = TeamTracker()
+        for killer, victim in [("r0", "b0"), ("r1", "b0"), ("r2", "b0"), ("r2", "b1")]:
+            tracker.add_kill(killer, victim)
+        self.assertEqual(({"r0", "r1", "r2"}, {"b0", "b1"}), tracker.teams("r0"))
+
+        # r0 is autobalanced to blue
+        tracker.add_kill("r0", "r1")
+        tracker.add_kill("r2", "r0")
+        self.assertEqual(({"r1", "r2"}, {"r0", "b0", "b1"}), tracker.teams("r1"))
+
+    def test_pair_rebuild_matches_kill_rebuild(self):
+        # the tracker only keeps the latest kill of each pair of players, so
+        # it has to infer the same teams as a rebuild over every kill
+        def teams_from_kills(user, kills):
+            parent, parity = {}, {}
+
+            def find(p):
+                flip = 0
+                while parent[p] != p:
+                    flip ^= parity[p]
+                    p = parent[p]
+                return p, flip
+
+            for killer, victim in reversed(kills):
+                for p in (killer, victim):
+                    if p not in parent:
+                        parent[p], parity[p] = p, 0
+                (root_k, flip_k), (root_v, flip_v) = find(killer), find(victim)
+                if root_k != root_v:
+                    parent[root_v] = root_k
+                    parity[root_v] = flip_k ^ flip_v ^ 1
+            if user not in parent:
+                return ({user}, set())
+            user_root, user_flip = find(user)
+            allies, enemies = set(), set()
+            for p in parent:
+                root, flip = find(p)
+                if root == user_root:
+                    (allies if flip == user_flip else enemies).add(p)
+            return (allies, enemies)
+
+        rng = random.Random(0)
+        red = [f"r{i}" for i in range(6)]
+        blue = [f"b{i}" for i in range(6)]
+        tracker = TeamTracker()
+        kills = []
+        for i in range(600):
+            if i % 100 == 99:
+                # autobalance moves a player without a line in the log
+                player = red.pop(rng.randrange(len(red)))
+                blue.append(player)
+                red.append(blue.pop(0))
+            killer, victim = rng.choice(red), rng.choice(blue)
+            if rng.random() < 0.5:
+                killer, victim = victim, killer
+            tracker.add_kill(killer, victim)
+            kills.append((killer, victim))
+            if i % 50 == 0 or i % 100 == 99:
+                self.assertEqual(teams_from_kills("r0", kills), tracker.teams("r0"))
+        # 12 players have at most 66 pairs however many kills there are
+        self.assertLessEqual(len(tracker._pairs), 66)
+
+
+def a2s_stand_in(sock, names):
+    """
+    answers A2S_PLAYER requests on the socket with the given usernames
+    """
+    challenge = b"\x01\x02\x03\x04"
+    while True:
+        try:
+            data, address = sock.recvfrom(1400)
+        except OSError:
+            return
+        if data[5:] != challenge:
+            sock.sendto(b"\xff\xff\xff\xffA" + challenge, address)
+            continue
+        reply = b"\xff\xff\xff\xffD" + bytes([len(names)])
+        for i, name in enumerate(names):
+            reply += bytes([i]) + name.encode() + b"\x00" + struct.pack("<lf", 0, 1.0)
+        sock.sendto(reply, address)
+
+
+class TestRosterTracker(unittest.TestCase):
+
+    def test_leave_and_rejoin(self):
+        state = GameState("foo", {}, {})
+        state.process_lines(["foo connected", "bar connected", "baz connected"] + d1 +
+                            ["baz killed foo with haz.", "baz left the game (Disconnect by user.)"])
+        self.assertNotIn("baz", state.names)
+        self.assertNotIn("baz", state.player_kills)
+        self.assertEqual(1, state.departed["baz"]["player_kills"])
+        self.assertEqual(({"foo"}, {"bar"}), state.team_tracker.teams("foo"))
+
+        state.process_line("baz connected")
+        self.assertEqual(1, state.player_kills["baz"])
+        self.assertEqual({}, state.departed)
+
+    def test_a2s_roster(self):
+        state = GameState("foo", {}, {})
+        state.process_lines(["foo connected", "bar connected"] + d1)
+        roster = frozenset({"foo"})
+        state.update_roster(roster)
+        self.assertIn("bar", state.names)
+        # the poller returns the same roster until the next query
+        state.update_roster(roster)
+        self.assertIn("bar", state.names)
+        state.update_roster(frozenset({"foo", "qux"}))
+        self.assertNotIn("bar", state.names)
+        self.assertIn("qux", state.names)
+        self.assertIn("bar", state.departed)
+
+    def test_team_switch(self):
+        tracker = TeamTracker([KillEvent("r0", "b0", "", False),
+                               KillEvent("r1", "b0", "", False),
+                               KillEvent("b1", "r0", "", False)])
+        tracker.switch_team("r1")
+        self.assertEqual(({"b1", "b0", "r1"}, {"r0"}), tracker.teams("b1"))
+        tracker.remove_player("b0")
+        self.assertEqual(({"r0"}, {"b1", "r1"}), tracker.teams("r0"))
+
+    def test_link_through_departed_player(self):
+        # a and b are only known to be allies because both killed l
+        tracker = TeamTracker([KillEvent("a", "l", "", False),
+                               KillEvent("b", "l", "", False)])
+        tracker.switch_team("l")
+        self.assertEqual(({"a", "b", "l"}, set()), tracker.teams("a"))
+        tracker.remove_player("l")
+        self.assertEqual(({"a", "b"}, set()), tracker.teams("a"))
+        # l comes back on the other team
+        tracker.add_kill("l", "b")
+        self.assertEqual(({"a", "b"}, {"l"}), tracker.teams("a"))
+
+
+class TestRosterPoller(unittest.TestCase):
+
+    def test_cache_and_dedup(self):
+        calls = []
+        release = threading.Event()
+        def query(address, timeout):
+            calls.append(address)
+            release.wait(1)
+            return {"foo", "bar"}
+
+        poller = RosterPoller(ttl=60, query=query)
+        self.assertTrue(poller.request(("127.0.0.1", 27015)))
+        self.assertFalse(poller.request(("127.0.0.1", 27015)))
+        self.assertEqual(frozenset(), poller.roster(("127.0.0.1", 27015)))
+        release.set()
+        poller.wait()
+        self.assertEqual({"foo", "bar"}, poller.roster(("127.0.0.1", 27015)))
+        self.assertFalse(poller.request(("127.0.0.1", 27015)))
+        self.assertEqual(1, len(calls))
+
+    def test_backoff(self):
+        def query(address, timeout):
+            raise socket.timeout()
+
+        poller = RosterPoller(ttl=0, query=query)
+        with contextlib.redirect_stdout(io.StringIO()):
+            poller.request(("127.0.0.1", 27015))
+            poller.wait()
+        self.assertFalse(poller.request(("127.0.0.1", 27015)))
+
+    def test_backoff_on_errors(self):
+        def query(address, timeout):
+            raise ImportError("No module named 'a2s'")
+
+        poller = RosterPoller(ttl=0, query=query)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertTrue(poller.request(("127.0.0.1", 27015)))
+            poller.wait()
+        self.assertIn("a2s", out.getvalue())
+        self.assertFalse(poller.request(("127.0.0.1", 27015)))
+
+    @unittest.skipUnless(importlib.util.find_spec("a2s"), "a2s is not installed")
+    def test_udp_server(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        server = threading.Thread(target=a2s_stand_in, args=(sock, ["foo", "bar"]),
+                                  daemon=True)
+        server.start()
+
+        address = sock.getsockname()
+        poller = RosterPoller()
+        poller.request(address)
+        poller.wait()
+        sock.close()
+        self.assertEqual({"foo", "bar"}, poller.roster(address))
+
+
+class TestComputeWorker(unittest.TestCase):
+
+    def test_snapshots(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "logs.txt")
+            user_path = os.path.join(tmp, "tf2_user.txt")
+            with open(user_path, "w", encoding="utf-8") as f:
+                f.write("foo\n")
+            with open(log_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(["foo connected", "bar connected"] + d1) + "\n")
+
+            worker = ComputeWorker(log_path, user_path, {}, {"baz.": "melee"})
+            worker.publish(worker.tick())
+            snapshot = worker.latest()
+            self.assertEqual((4, 1, 1), (snapshot.kills, snapshot.deaths, snapshot.streak))
+            self.assertEqual(["foo"], [row.name for row in snapshot.allies])
+            self.assertEqual(["bar"], [row.name for row in snapshot.enemies])
+            self.assertEqual(1, dict(snapshot.ally_killtypes)["melee"])
+            self.assertIsNone(worker.latest())
+
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write("foo killed bar with baz.\n")
+            self.assertEqual(2, worker.tick().streak)
+
+    def test_survives_errors(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            user_path = os.path.join(tmp, "tf2_user.txt")
+            with open(user_path, "w", encoding="utf-8") as f:
+                f.write("foo\n")
+            worker = ComputeWorker(os.path.join(tmp, "logs.txt"), user_path, {}, {},
+                                   interval=0.01)
+            ticks = []
+            tick = worker.tick
+
+            def failing_tick():
+                ticks.append(1)
+                if len(ticks) == 1:
+                    raise sqlite3.OperationalError("database is locked")
+                return tick()
+
+            with open(os.path.join(tmp, "logs.txt"), "w", encoding="utf-8") as f:
+                f.write("foo killed bar with baz.\n")
+            worker.tick = failing_tick
+            with contextlib.redirect_stderr(io.StringIO()) as stderr:
+                worker.start()
+                snapshot = worker.snapshots.get(timeout=5)
+                worker.stop()
+                worker.join()
+            self.assertEqual(1, snapshot.kills)
+            self.assertIn("database is locked", stderr.getvalue())
+
+    def test_missing_log_printed_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            worker = ComputeWorker(os.path.join(tmp, "logs.txt"),
+                                   os.path.join(tmp, "tf2_user.txt"), {}, {}, interval=0.01)
+            ticks = []
+            tick = worker.tick
+
+            def counted_tick():
+                ticks.append(1)
+                if len(ticks) == 5:
+                    worker.stop()
+                return tick()
+
+            worker.tick = counted_tick
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                worker.run()
+            self.assertEqual(5, len(ticks))
+            self.assertEqual(1, len(out.getvalue().splitlines()))
+
+
+class TestStatsServer(unittest.TestCase):
+
+    def test_stop_without_start(self):
+        server = StatsServer(port=0)
+        server.stop()
+
+    def snapshots(self):
+        state = GameState("foo", {}, {"baz.": "melee"})
+        state.process_lines(["foo connected", "bar connected"])
+        for line in d1:
+            state.process_line(line)
+            yield build_snapshot(state)
+
+    def test_stream(self):
+        server = StatsServer(port=0, keepalive=0.1)
+        server.start()
+        try:
+            snapshots = list(self.snapshots())
+            server.publish(snapshots[0])
+            host, port = server.address
+            with urllib.request.urlopen(f"http://{host}:{port}/snapshot") as response:
+                self.assertEqual(1, json.load(response)["kills"])
+
+            with urllib.request.urlopen(f"http://{host}:{port}/events") as events:
+                self.assertEqual(b"id: 1\n", events.readline())
+                self.assertEqual(b"event: snapshot\n", events.readline())
+                self.assertEqual(1, json.loads(events.readline()[6:])["kills"])
+                events.readline()
+                server.publish(snapshots[1])
+                self.assertEqual(b"id: 2\n", events.readline())
+                self.assertEqual(b"event: delta\n", events.readline())
+                delta = json.loads(events.readline()[6:])
+                self.assertEqual(2, delta["kills"])
+                self.assertNotIn("deaths", delta)
+        finally:
+            server.stop()
+
+    def test_slow_viewer(self):
+        broadcaster = StatsBroadcaster(max_pending=2)
+        client = broadcaster.connect()
+        for snapshot in self.snapshots():
+            broadcaster.publish(snapshot)
+        self.assertEqual(2, broadcaster.resyncs)
+        self.assertTrue(client.get_nowait().startswith(b"id: 5\nevent: snapshot\n"))
+        broadcaster.disconnect(client)
+        self.assertEqual(0, broadcaster.viewers())
+
+
+class TestMultiLogWatcher(unittest.TestCase):
+
+    def test_two_logs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, f"logs{i}.txt") for i in range(2)]
+            for path in paths:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("\n".join(["foo connected", "bar connected"] + d1) + "\n")
+
+            snapshots = {}
+            watcher = MultiLogWatcher({}, {"baz.": "melee"},
+                                      lambda name, s: snapshots.__setitem__(name, s),
+                                      roster_poller=RosterPoller(query=lambda a, t: set()))
+            watcher.add(WatchedLog("foo", paths[0], "foo"))
+            watch = watcher.add(WatchedLog("bar", paths[1], "bar"))
+            self.assertIs(watcher.watches["foo"].game_state.weapon_dmg,
+                          watch.game_state.weapon_dmg)
+
+            async def poll_all():
+                await asyncio.gather(*(watcher.poll(w) for w in watcher.watches.values()))
+            asyncio.run(poll_all())
+            self.assertEqual(4, snapshots["foo"].kills)
+            self.assertEqual(1, snapshots["bar"].kills)
+
+            snapshots.clear()
+            with open(paths[1], "a", encoding="utf-8") as f:
+                f.write("bar killed foo with baz.\n")
+            asyncio.run(poll_all())
+            self.assertEqual(["bar"], list(snapshots))
+            self.assertEqual(2, snapshots["bar"].kills)
+
+            # an error in one log does not stop the others
+            def fail(rotated, lines):
+                raise ValueError("bad line")
+            watcher.watches["foo"].process = fail
+            with open(paths[1], "a", encoding="utf-8") as f:
+                f.write("bar killed foo with baz.\n")
+            with contextlib.redirect_stderr(io.StringIO()), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(poll_all())
+            self.assertEqual(3, snapshots["bar"].kills)
+
+
+class TestGameReplay(unittest.TestCase):
+
+    def test_seek(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "logs.txt")
+            with open(log_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(generate_lines(log_options(players=8, kills_per_game=300,
+                                                               games=2))) + "\n")
+            replay = GameReplay(log_path, "player0", {}, {}, game=0, every=50)
+            self.assertEqual(len(replay) // 50 + 1, len(replay.checkpoints))
+
+            for position in [len(replay), 120, 0, 99, 100, 101, 37]:
+                state = GameState("player0", clock=None)
+                state.process_lines(replay.lines[:position])
+                self.assertEqual(build_snapshot(state), replay.snapshot(position))
+                self.assertEqual(list(state.kill_events), list(replay.state.kill_events))
+
+            # the events are read back from the sidecar file and applied
+            # without parsing the lines
+            reloaded = GameReplay(log_path, "player0", {}, {}, game=0, every=50)
+            self.assertEqual(len(replay), reloaded.parsed)
+            self.assertEqual(replay.checkpoints, reloaded.checkpoints)
+            self.assertEqual(replay.snapshot(222), reloaded.snapshot(222))
+
+            # a changed weapon table builds the checkpoints again
+            weapons = GameReplay(log_path, "player0", {"knife.": "spy"}, {"knife.": "melee"},
+                                 game=0, every=50)
+            state = GameState("player0", {"knife.": "spy"}, {"knife.": "melee"}, clock=None)
+            state.process_lines(weapons.lines[:222])
+            self.assertEqual(build_snapshot(state), weapons.snapshot(222))
+
+            with self.assertRaisesRegex(ValueError, "no game 2"):
+                GameReplay(log_path, "player0", {}, {}, game=2)
+            empty_path = os.path.join(tmp, "empty.txt")
+            with open(empty_path, "w", encoding="utf-8") as f:
+                f.write("foo connected\n")
+            with self.assertRaisesRegex(ValueError, "no games"):
+                GameReplay(empty_path, "player0", {}, {})
+
+            # a broken file or events of an unknown type are parsed again
+            for data in ('{"key": [', json.dumps({"key": replay._key(), "lines": 1,
+                                                   "events": [[1, "RemovedEvent"]]})):
+                with open(replay.events_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                rebuilt = GameReplay(log_path, "player0", {}, {}, game=0, every=50)
+                self.assertEqual(replay.snapshot(222), rebuilt.snapshot(222))
+
+
+class TestSlidingWindowMetrics(unittest.TestCase):
+
+    def test_windows(self):
+        now = [0.0]
+        metrics = SlidingWindowMetrics(seconds=60, events=2, clock=lambda: now[0])
+        metrics.add_kill("foo", "bar")
+        now[0] = 30
+        metrics.add_kill("foo", "baz")
+        metrics.add_death("foo")
+        self.assertEqual({"foo", "bar", "baz"}, metrics.active_players())
+        self.assertEqual(4.0, metrics.kills_per_minute(["foo"]))
+        self.assertEqual(2.0, metrics.kd(["foo"]))
+
+        # the first kill leaves the time window and the event window
+        now[0] = 70
+        self.assertEqual({"foo", "baz"}, metrics.active_players())
+        self.assertEqual(1.0, metrics.kd(["foo"]))
+        self.assertEqual(1.0, metrics.deaths_per_minute(["foo"]))
+        now[0] = 200
+        self.assertEqual({"foo", "baz"}, metrics.active_players())
+        self.assertEqual({}, metrics.timed.kills)
+
+    def test_without_clock(self):
+        metrics = SlidingWindowMetrics(events=2, clock=None)
+        for victim in ["bar", "baz", "bar"]:
+            metrics.add_kill("foo", victim)
+        metrics.add_kill("bar", "foo")
+        self.assertEqual({"foo", "bar"}, metrics.active_players())
+        self.assertEqual(1.0, metrics.kd(["foo"]))
+        self.assertEqual(0.0, metrics.kills_per_minute(["foo"]))
+
+    def test_backlog(self):
+        # a restart reads the whole game so far in its first tick
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "logs.txt")
+            user_path = os.path.join(tmp, "tf2_user.txt")
+            with open(user_path, "w", encoding="utf-8") as f:
+                f.write("foo\n")
+            with open(log_path, "w", encoding="utf-8") as f:
+                f.write("foo killed bar with baz.\n" * 150 + "bar killed foo with baz.\n" * 50)
+            worker = ComputeWorker(log_path, user_path, {}, {})
+            snapshot = worker.tick()
+            self.assertEqual(200, snapshot.kills + snapshot.deaths)
+            self.assertEqual(0.0, snapshot.kills_per_minute)
+            self.assertEqual(0.0, snapshot.deaths_per_minute)
+            # the event window still has a recent kill/death ratio
+            self.assertEqual(1.0, snapshot.recent_kd)
+
+            now = [worker.game_state.metrics.started]
+            worker.game_state.metrics.clock = lambda: now[0]
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write("foo killed bar with baz.\n")
+            now[0] += 30
+            snapshot = worker.tick()
+            self.assertEqual(2.0, snapshot.kills_per_minute)
+
+
+def without_session(snapshot):
+    # the live rates and the reset count depend on how the game was read
+    return snapshot._replace(game_id=0, kills_per_minute=0.0, deaths_per_minute=0.0,
+                             recent_kd=0.0, ally_recent_kd=0.0, enemy_recent_kd=0.0)
+
+
+class TestEventCache(unittest.TestCase):
+
+    def test_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "logs.txt")
+            user_path = os.path.join(tmp, "tf2_user.txt")
+            cache_path = os.path.join(tmp, "events.db")
+            with open(user_path, "w", encoding="utf-8") as f:
+                f.write("player0\n")
+            lines = list(generate_lines(log_options(players=8, kills_per_game=200, games=2)))
+            with open(log_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines[:-100]) + "\n")
+
+            def worker(key="a"):
+                return ComputeWorker(log_path, user_path, {}, {},
+                                     roster_poller=RosterPoller(query=lambda a, t: set()),
+                                     event_cache=EventCache(cache_path, key))
+
+            first = worker()
+            first.tick()
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines[-100:]) + "\nplayer1 killed")
+            # the restarted workers catch up on the whole game, so only the
+            # first one has kills in the time window of the live metrics
+            expected = without_session(first.tick())
+            first.event_cache.close()
+
+            second = worker()
+            self.assertEqual(expected, without_session(second.tick()))
+            self.assertEqual(first.game_state.line_number, second.game_state.line_number)
+            self.assertEqual(first.follower.line_offset, second.follower.line_offset)
+            second.event_cache.close()
+
+            # a new weapon table drops the cache
+            third = worker("b")
+            self.assertEqual(expected, without_session(third.tick()))
+            self.assertEqual(first.follower.offset, third.follower.offset)
+            third.event_cache.close()
+
+    def test_restart_in_second_game(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "logs.txt")
+            user_path = os.path.join(tmp, "tf2_user.txt")
+            cache_path = os.path.join(tmp, "events.db")
+            with open(user_path, "w", encoding="utf-8") as f:
+                f.write("player0\n")
+            lines = list(generate_lines(log_options(players=8, kills_per_game=200, games=2)))
+            second_game = max(i for i, l in enumerate(lines) if l == "Team Fortress")
+            with open(log_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines[:second_game - 50]) + "\n")
+
+            def worker():
+                return ComputeWorker(log_path, user_path, {}, {},
+                                     roster_poller=RosterPoller(query=lambda a, t: set()),
+                                     event_cache=EventCache(cache_path, "a"))
+
+            first = worker()
+            first.tick()
+            # the second game starts in the middle of a read
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines[second_game - 50:second_game + 100]) + "\n")
+            first.tick()
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines[second_game + 100:]) + "\n")
+            expected = without_session(first.tick())
+            first.event_cache.close()
+
+            # only the chunks of the second game are kept
+            game_offset = first.latest_game_offset()
+            conn = sqlite3.connect(cache_path)
+            self.assertEqual([(game_offset,)], conn.execute("select start from log").fetchall())
+            self.assertTrue(all(start >= game_offset for (start,) in
+                                conn.execute("select start from chunk")))
+            conn.close()
+
+            # a restart applies the cached events up to the end of the log
+            cache = EventCache(cache_path, "a")
+            self.assertEqual(first.follower.line_offset,
+                             cache.restore(log_path, game_offset, GameState("player0")))
+            cache.close()
+            second = worker()
+            self.assertEqual(expected, without_session(second.tick()))
+            second.event_cache.close()
+
+
+class FakeWidget:
+
+    def __init__(self):
+        self.configured = []
+
+    def configure(self, **options):
+        self.configured.append(options)
+
+
+class TestViewModel(unittest.TestCase):
+
+    def test_only_changes(self):
+        view_model = ViewModel()
+        label = FakeWidget()
+        view_model.begin_tick()
+        view_model.set(label, text="foo", fg="black")
+        self.assertEqual(1, view_model.end_tick())
+
+        view_model.begin_tick()
+        view_model.set(label, text="foo", fg="black")
+        view_model.set(label, text="foo", fg="red")
+        self.assertEqual(1, view_model.end_tick())
+        self.assertEqual([{"text": "foo", "fg": "black"}, {"fg": "red"}], label.configured)
+        self.assertEqual([1, 1], view_model.tick_updates)
+
+
+class FakeCanvas:
+    """
+    The canvas item calls used by the charts, on plain lists of coordinates
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.calls = 0
+        self.last_id = 0
+
+    def _create(self, *coords, tags=(), **options):
+        self.calls += 1
+        self.last_id += 1
+        self.items[self.last_id] = [list(coords), set(tags)]
+        return self.last_id
+
+    create_line = _create
+    create_text = _create
+
+    def _find(self, tag_or_id):
+        return [i for i, (_, tags) in self.items.items()
+                if i == tag_or_id or tag_or_id in tags]
+
+    def coords(self, item, *coords):
+        self.calls += 1
+        self.items[item][0] = list(coords)
+
+    def move(self, tag, dx, dy):
+        self.calls += 1
+        for i in self._find(tag):
+            c = self.items[i][0]
+            c[0::2] = [x + dx for x in c[0::2]]
+            c[1::2] = [y + dy for y in c[1::2]]
+
+    def scale(self, tag, x0, y0, fx, fy):
+        self.calls += 1
+        for i in self._find(tag):
+            c = self.items[i][0]
+            c[0::2] = [x0 + (x - x0) * fx for x in c[0::2]]
+            c[1::2] = [y0 + (y - y0) * fy for y in c[1::2]]
+
+    def delete(self, tag):
+        self.calls += 1
+        for i in self._find(tag):
+            del self.items[i]
+
+    def itemconfigure(self, item, **options):
+        self.calls += 1
+
+    def lines(self, tag):
+        return sorted([round(v, 6) for v in self.items[i][0]] for i in self._find(tag))
+
+
+class TestLineChart(unittest.TestCase):
+
+    def check_drawn(self, chart, canvas):
+        # the incrementally updated segments are where a fresh chart with
+        # the same range draws them
+        values = chart.values("s")
+        expected = [[round(v, 6) for v in
+                     chart.point(i, values[i]) + chart.point(i + 1, values[i + 1])]
+                    for i in range(len(values) - 1)]
+        self.assertEqual(sorted(expected), canvas.lines("data"))
+
+    def test_incremental_updates(self):
+        canvas = FakeCanvas()
+        chart = LineChart(canvas, "test", max_points=5)
+        chart.add_series("s")
+        for value in [3, 4, 1, 10, -5, 2, 7]:
+            chart.append("s", value)
+            self.check_drawn(chart, canvas)
+        self.assertEqual([-5, 2, 7], chart.values("s")[-3:])
+        self.assertEqual(5, len(chart.values("s")))
+        self.assertLessEqual(chart.low, -5)
+        self.assertGreaterEqual(chart.high, 10)
+
+        # a killstreak history slides along and its last life still grows
+        self.assertFalse(chart.set_points("s", [1, 10, -5, 2, 7]))
+        self.assertTrue(chart.set_points("s", [10, -5, 2, 8, 0]))
+        self.check_drawn(chart, canvas)
+        self.assertEqual([10, -5, 2, 8, 0], chart.values("s"))
+
+        # appending to a full chart costs the same canvas calls every time
+        calls = canvas.calls
+        chart.append("s", 1)
+        self.assertEqual(3, canvas.calls - calls)
+
+        self.assertTrue(chart.set_points("s", [5, 6]))
+        self.check_drawn(chart, canvas)
+        chart.clear()
+        self.assertEqual([], canvas.lines("data"))
+        self.assertIsNone(chart.low)
+
+
+class TestBatchAnalyzer(unittest.TestCase):
+
+    def test_games(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "logs.txt")
+            with open(log_path, "w", encoding="utf-8") as f:
+                for game_map, end in [("cp_badlands", []),
+                                      ("pl_upward", ["bar left the game (Disconnect)"])]:
+                    f.write("\n".join(["Team Fortress", f"Map: {game_map}",
+                                       "foo connected", "bar connected"] + d1 + end) + "\n")
+
+            db_path = os.path.join(tmp, "stats.db")
+            batch_analyzer.main([log_path, "--weapons", "tf2_weapons.db",
+                                 "--jobs", "2", "--sqlite", db_path])
+            conn = sqlite3.connect(db_path)
+            self.assertEqual([(0, "cp_badlands", 5), (1, "pl_upward", 5)],
+                             conn.execute("select game, map, kills from game").fetchall())
+            self.assertEqual([(0, "bar", 1, 4, 1), (0, "foo", 4, 1, 3)], conn.execute(
+                "select game, player, kills, deaths, best_streak from player_stats"
+                " where game = 0").fetchall())
+            # a player that left still has a row for the game
+            self.assertEqual([("bar", 1, 4), ("foo", 4, 1)], conn.execute(
+                "select player, kills, deaths from player_stats where game = 1").fetchall())
+            conn.close()
+
+
+class TestRatingStore(unittest.TestCase):
+
+    def test_career_elo(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ratings = RatingStore(os.path.join(tmp, "ratings.db"), cache_size=1)
+            state = GameState("foo", ratings=ratings)
+            state.process_lines(["foo connected", "bar connected"] + d1)
+            final_elo = dict(state.player_elo)
+            state.process_line("Team Fortress")
+
+            self.assertEqual(final_elo["foo"], ratings.get("foo"))
+            self.assertEqual(final_elo["bar"], ratings.get("bar"))
+            self.assertEqual(1600.0, ratings.get("baz"))
+
+            state.process_line("foo killed bar with baz.")
+            self.assertGreater(state.player_elo["foo"], final_elo["foo"])
+
+            # a rival that left is shown with the elo it left with
+            state.process_lines(["bar killed foo with baz.", "bar left the game (Disconnect)"])
+            bar_elo = state.departed["bar"]["player_elo"]
+            self.assertNotEqual(1600.0, bar_elo)
+            self.assertEqual([("bar", bar_elo)],
+                             [(r.name, r.elo) for r in build_snapshot(state).rivals])
+            ratings.close()
+
+
+class TestEloReplay(unittest.TestCase):
+
+    def test_matches_calculate_elo(self):
+        kill_events = [parse_kill_line(l, {"foo", "bar"}) for l in d1] * 3
+        elo = {"foo": 1600.0, "bar": 1600.0}
+        for ke in kill_events:
+            elo[ke.killer], elo[ke.victim] = calculate_elo(elo[ke.killer], elo[ke.victim])
+
+        replay = EloReplay()
+        replay.replay(kill_events, batch_size=4)
+        self.assertEqual(elo, replay.as_dict())
+        self.assertEqual([elo, elo], list(replay_games([kill_events, kill_events], jobs=1)))
+
+
+class TestEventStore(unittest.TestCase):
+
+    def test_list_like(self):
+        kill_events = [parse_kill_line(l, {"foo", "bar"}) for l in d1]
+        store = EventStore(kill_events)
+        self.assertEqual(kill_events, list(store))
+        self.assertEqual(kill_events[-2:], list(store[-2:]))
+        self.assertEqual(kill_events[::-1][1:3], list(store[::-1][1:3]))
+        self.assertEqual(kill_events[-1], store[-1])
+        self.assertEqual(get_killstreak("foo", kill_events), get_killstreak("foo", store))
+        self.assertEqual(get_teams("foo", kill_events), get_teams("foo", store))
+        self.assertEqual(["foo", "bar", "baz.", "bizz.", "haz."], store.strings)
+
+
+class TestWeaponCategorizer(unittest.TestCase):
+
+    def test_discover_and_apply(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "weapons.db")
+            log_path = os.path.join(tmp, "logs.txt")
+            review_path = os.path.join(tmp, "review.csv")
+            shutil.copy("tf2_weapons.db", db_path)
+            with open(log_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(d1 + ["foo killed bar with knife. (crit)"]) + "\n")
+
+            tf2_weapon_categorizer.main(["--log", log_path, "--db", db_path,
+                                         "--discover", review_path])
+            with open(review_path, newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f))
+            self.assertEqual([["haz.", "3"], ["baz.", "1"], ["bizz.", "1"]],
+                             [row[:2] for row in rows[1:]])
+
+            rows[1][2:4] = ["spy", "melee"]
+            rows[2][2:4] = ["spy", "laser"]
+            with open(review_path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows(rows)
+            tf2_weapon_categorizer.main(["--log", log_path, "--db", db_path,
+                                         "--apply", review_path])
+
+            conn = sqlite3.connect(db_path)
+            self.assertEqual([("haz.", "spy", "melee")], conn.execute(
+                "select * from weapon where name in ('haz.', 'baz.')").fetchall())
+            conn.close()
+
+
+class TestSyntheticLogs(unittest.TestCase):
+
+    def test_generated_game(self):
+        options = log_options(players=10, kills_per_game=200, ambiguous_names=2, seed=1)
+        lines = list(generate_lines(options))
+        self.assertEqual(lines, list(generate_lines(options)))
+
+        state = GameState("player0", {"knife.": "spy"}, {"knife.": "melee"})
+        state.process_lines(lines)
+        kill_lines = [l for l in lines if " with " in l]
+        self.assertEqual(len(kill_lines), len(state.kill_events))
+        self.assertEqual(set(player_names(options)), set(state.names))
+        self.assertTrue({ke.killer for ke in state.kill_events} <= set(state.names))
+
+
+class TestTickProfiler(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(95, percentile(values, 95))
+        self.assertEqual(0.0, percentile([], 50))
+
+    def test_stages(self):
+        profiler = TickProfiler("test", budget=60, window=3)
+        for _ in range(5):
+            profiler.begin_tick()
+            with profiler.stage("read"):
+                pass
+            with profiler.stage("parse"):
+                pass
+            profiler.end_tick()
+        stats = profiler.stats()
+        self.assertEqual({"read", "parse", "tick"}, set(stats))
+        self.assertEqual(3, stats["tick"]["count"])
+        self.assertEqual(0, profiler.slow_ticks)
+
+    def test_disabled(self):
+        profiler = TickProfiler("test", enabled=False)
+        profiler.begin_tick()
+        with profiler.stage("read"):
+            pass
+        self.assertIsNone(profiler.end_tick())
+        self.assertEqual({}, profiler.stats())
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        code = ("import sys, log_parsing, dashboard_model, batch_analyzer, tf2_dashboard\n"
+                "print(sorted(m for m in ('a2s', 'networkx', 'matplotlib', 'PIL') "
+                "if m in sys.modules))")
+        out = subprocess.run([sys.executable, "-c", code], check=True,
+                             capture_output=True, text=True).stdout
+        self.assertEqual("[]", out.strip())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,64 +1,35 @@
 """
 A gui dashboard that reads the Team Fortress 2 log and shows stats
 about the game
-"""
 
-import os
-from typing import List, Dict 
-from statistics import mean
-import tkinter as tk
-from collections import defaultdict
-import sqlite3
-from PIL import ImageTk, Image # type: ignore
-from log_parsing import * #pylint: disable=unused-import,unused-wildcard-import
+    python tf2_dashboard.py [--profile] [--serve PORT] [--log LOG] [--user USER_FILE]
+    python tf2_dashboard.py --replay [GAME] [--speed LINES]
 
+Importing this module has no side effects.  The tk window, the weapon
+table, the rating store and the compute worker are created by main, and
+the class icons are loaded the first time they are shown.  The charts are
+drawn on tk canvases, matplotlib is only needed for the old killstreak plot
+of --matplotlib.
+"""
 
-import matplotlib
-matplotlib.use("TkAgg")
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+import argparse
+import time
+import tkinter as tk
+from typing import Dict, List, Optional
 
+from dashboard_model import ComputeWorker, PlayerRow, Snapshot
+from event_cache import EventCache
+from log_reader import default_log_path
+from rating_store import RatingStore
+from tick_profiler import TickProfiler, dump_json
+from tk_chart import LineChart
+from view_model import ViewModel
+from weapons import load_weapons, weapons_key
 
-fpath = "C:\\Program Files (x86)\\Steam\\steamapps\\common\\Team Fortress 2\\tf\\logs.txt"
 
-def read_latest_game(path: str) -> Optional[List[str]]:
-    """
-    Reads the tf2 log file from the given path and returns the lines for the
-    most recent or in progress game.  If there is not a game in the file, it
-    returns none.
-    """
-    with open(path, "rb") as f:
-        for i in range(-100_000, -1 * os.path.getsize(path), -100_000):
-            f.seek(i, 2)
-            s = f.read().decode("utf-8", errors="replace")
-            game_index = s.rfind(os.linesep + "Team Fortress" + os.linesep + "Map:")
-            if game_index > 0:
-                return re.split(os.linesep, s[game_index:])
-        f.seek(0)
-        s = f.read().decode("utf-8", errors="replace")
-        game_index = s.rfind(os.linesep + "Team Fortress")
-        if game_index > 0:
-            return re.split(os.linesep, s[game_index:])
-        return None
-
- 
 class_icons = {"demoman", "spy", "medic", "soldier", "heavyweapons", "sniper",
                "pyro", "scout", "many", "engineer", "empty"}
 
-conn = sqlite3.connect("tf2_weapons.db")
-cur = conn.cursor()
-q: str = "select name, tf2_class, damage_type from weapon"
-weapon_class = {}
-weapon_dmg = {}
-for name, tf2_class, damage_type in cur.execute(q):
-    weapon_class[name] = tf2_class
-    weapon_dmg[name] = damage_type
-conn.close()
-
-master = tk.Tk()
-master.title("TF2 Dashboard")
-labels = [ [tk.Label(master, anchor="e") for column in range(6)]
-           for row in range(21)]
 headings = {
     (0,0): "Allies",
     (0,3): "Enemies",
@@ -80,225 +51,383 @@ headings = {
     (20, 0): "Elo"
     }
 
-
-
-tk_kills = tk.IntVar()
-tk_deaths = tk.IntVar()
-tk_kd = tk.StringVar()
-tk_streak = tk.StringVar()
-tk_elo = tk.StringVar()
-tk_ally_kills = tk.IntVar()
-tk_enemy_kills = tk.IntVar()
-
-# setting minimum column widths for name columns.  This helps reduce flickering
-# when a player with a long name is moved on or off the scoreboard
-labels[0][0].configure(width=15)
-labels[0][3].configure(width=15)
-
-labels[9][1].configure(textvariable=tk_ally_kills)
-labels[9][4].configure(textvariable=tk_enemy_kills)
-
-labels[16][1].configure(textvariable=tk_kills)
-labels[17][1].configure(textvariable=tk_deaths)
-labels[18][1].configure(textvariable=tk_kd)
-labels[19][1].configure(textvariable=tk_streak)
-labels[20][1].configure(textvariable=tk_elo)
-
-rival_vars = [tk.StringVar() for _ in range(4)]
-rival_elo_vars = [tk.StringVar() for _ in range(4)]
-rival_class_icons = []
-
-ally_labels = [labels[row][0] for row in range(2, 8)]
-ally_elo_labels = [labels[row][1] for row in range(2, 8)]
-ally_class_labels = [labels[row][2] for row in range(2, 8)]
-
-
-for row, var, elo_var in zip(range(16, 20), rival_vars, rival_elo_vars ):
-    labels[row][3].configure(textvariable=var)
-    labels[row][4].configure(textvariable=elo_var)
-    rival_class_icons.append(labels[row][5])
-  
-
-
-for row in range(21):
-    for column in range(6):
-        labels[row][column].grid(row=row, column=column,
-                                 sticky=tk.W if column in {2, 5} else tk.E)
-        if headings.get( (row, column)):
-            labels[row][column].configure(text=headings[(row, column)],
-                                          font=('Helvetica', 12, 'bold'))
-
-tk_ize = lambda c: ImageTk.PhotoImage(Image.open(f"tf2_icons/{c}.png").resize((16,16)))
-class_tk_imgs = {cn: tk_ize(cn) for cn in class_icons}
-
-tkf = Figure(figsize=(5,4), dpi=100)
-tk_subplot = tkf.add_subplot(111)
-canvas = FigureCanvasTkAgg(tkf, master)
-canvas.get_tk_widget().grid(row=21, column=0, columnspan=20, rowspan=2,
-           sticky=tk.W+tk.E+tk.N+tk.S, padx=5, pady=5)
-
-
-def update_avg_team_elo(cells, allies, enemies, player_elo):
-    if allies and enemies:
-        ally_avg_elo = int(mean(player_elo.get(a) for a in allies))
-        enemy_avg_elo = int(mean(player_elo.get(a) for a in enemies))
-    else:
-        ally_avg_elo = 1600
-        enemy_avg_elo = 1600
-
-    cells[0].configure(text="Team Elo", font=('Helvetica', 12, 'bold'))
-    cells[1].configure(text=ally_avg_elo, fg="black")
-    cells[3].configure(text="Team Elo", font=('Helvetica', 12, 'bold'))
-    cells[4].configure(text=enemy_avg_elo, fg="black")
-    if ally_avg_elo > enemy_avg_elo:
-        cells[1].configure(fg="green")
-        cells[4].configure(fg="red")
-    elif ally_avg_elo < enemy_avg_elo:
-        cells[1].configure(fg="red")
-        cells[4].configure(fg="green")
-
 # ^(.*)(defended|captured).*for team #([23])$ use for extra info, game state, and spawn info
-# fasfasdfasdf was moved to the other team for game balance
-# USER1 left the game (disconnected by user).
 
 # estimate medic players by looking for players with low kills in top half of
 # a2s scoreboard
 
-def render() -> None:
+
+class Dashboard:
     """
-    Updates the stats in the tkinter gui
+    The widgets of the dashboard.  render applies a snapshot from the
+    compute worker to them.
     """
-    user = ""
-    with open("tf2_user.txt", encoding="utf-8") as f:
-        user = f.read().strip()
-
-    
-    lines = read_latest_game(fpath)
-    if not lines:
-        return None
-    gamer_names =  read_connections(lines) 
-    player_elo: Dict[str, float] = defaultdict(lambda: 1600.0)
-    rivals: Dict = defaultdict(lambda: 0)
-    class_deaths: Dict = defaultdict(lambda: 0)
-    dmg_type_deaths: Dict = defaultdict(lambda: 0)
-    player_class: Dict = {}
-
-    prev_lines = len(lines)
-    game_lines = latest_game_lines(lines, user)
-    opt_kill_events = [parse_kill_line(l, gamer_names) for l in game_lines]
-    kill_events: List[KillEvent] = [a for a in opt_kill_events if a]
-
-    # the log does not contain disconnection events. This is a workaround
-    # to only include players who are actively doing something.
-    active_players = set(ke.killer for ke in kill_events[-100:]).union(
-                         ke.victim for ke in kill_events[-100:])
-
-    allies, enemies = get_teams(user, kill_events)
-    allies = [a for a in allies if a in active_players]
-    enemies = [a for a in enemies if a in active_players]
-
-    if len(lines) > prev_lines:
-        gamer_names.update(read_server_usernames(lines))
-    gamer_names.update(read_connections(game_lines))
-
-    
-    kills = sum(1 for k, _,_ in kill_events if k == user)
-    deaths: int = len([line for line in game_lines
-                      if f"killed {user}" in line or line == f"{user} died."])
-
-    ally_killtypes = {"bleed": 0, "bullet": 0, "explosive": 0, "fire": 0,
-                      "melee": 0, "many":0, "fall":0, "crush":0, "critical":0}
-    enemy_killtypes = {"bleed": 0, "bullet": 0, "explosive": 0, "fire": 0, "melee": 0,
-                       "many":0, "fall":0, "crush":0, "critical":0} 
-
-    for killer, victim, weapon in kill_events:
-        (k_elo, v_elo) = calculate_elo(player_elo[killer], player_elo[victim])
-        player_elo[killer] = k_elo
-        player_elo[victim] = v_elo
-
-        if weapon not in weapon_dmg:
-            pass
-        elif killer in allies:
-            ally_killtypes[weapon_dmg[weapon]] += 1
-        elif killer in enemies:
-            enemy_killtypes[weapon_dmg[weapon]] += 1
-        
-        if weapon_class.get(weapon) not in {None, "many"}:
-            player_class[killer] = weapon_class.get(weapon)
-            
-        if victim == user:
-            rivals[killer] += 1
-            class_deaths[weapon_class.get(weapon, "many")] += 1
-            dmg_type_deaths[weapon_dmg.get(weapon, "melee")] += 1
-
-    tk_kills.set(kills)
-    tk_deaths.set(deaths)
-    tk_kd.set(round(kills / deaths if deaths else 0, 2))
-    tk_streak.set(get_killstreak(user, kill_events))
-    tk_elo.set(int(player_elo[user]))
-
-    top_player_rows = list(range(2, 8))
-    player_rows = len(top_player_rows)
-    
-    ally_info = sorted([(player_elo[a], a, player_class.get(a, "many"))
-                        for a in allies], reverse=True)
-    
-    enemy_info = sorted([(player_elo[a], a, player_class.get(a, "many"))
-                         for a in enemies], reverse=True)
-
-
-            
-    rival_info = sorted((v, k) for k, v in rivals.items() if k in active_players)
-    rival_info += [(0, "")] * (player_rows - len(rival_info))
-
-    # padding info cells with empty data so old data is overwritten
-    ally_info += [(0, "", "empty")] * (player_rows - len(ally_info) )
-    enemy_info += [(0, "", "empty")] * (player_rows - len(enemy_info))
-
-    update_avg_team_elo(labels[8], allies, enemies, player_elo)
-    tk_ally_kills.set(sum(1 for a in kill_events if a.killer in allies))
-    tk_enemy_kills.set(sum(1 for a in kill_events if a.killer in enemies))
-    padded_kill_events = get_killstreaks(kill_events)[user][-8:]
-    tk_subplot.clear()
-    
-    tk_subplot.plot(list(range(len(padded_kill_events))),padded_kill_events)
-    tk_subplot.set_ylabel("Kills")
-    tk_subplot.set_xlabel("Life Number")
-    tk_subplot.set_title("Killstreak History")
-    canvas.draw()
-
-
-    for i, n in zip(range(11, 18), ["explosive","bullet", "fire", "melee"]):
-        labels[i][0].configure(text=n)
-        labels[i][1].configure(text=ally_killtypes[n])
-        labels[i][3].configure(text=n)
-        labels[i][4].configure(text=enemy_killtypes[n])
-
-    for i, (elo, uname, utf2_class) in zip(top_player_rows, ally_info):
-        labels[i][0].configure(text=f"{uname[:20]:>20}")
-        labels[i][1].configure(text=int(elo))
-        labels[i][2].configure(image=class_tk_imgs[utf2_class])
-
-
-    for i, (elo, uname, utf2_class) in zip(top_player_rows, enemy_info):
-        labels[i][3].configure(text=f"{uname[:20]:>20}")
-        labels[i][4].configure(text=int(elo))
-        labels[i][5].configure(image=class_tk_imgs[utf2_class])
-    
-
-    for (rdeaths, rname), rv, rev, rci in zip(sort_descending(rivals),
-                                         rival_vars,
-                                         rival_elo_vars,
-                                         rival_class_icons):
-        rv.set(f"{rname[:20]:>20} ({rdeaths})")
-        rev.set(int(player_elo[rname]))
-        rci.configure(image=class_tk_imgs[player_class.get(rname, "many")])
-
-    
-
-
-    master.after(5 * 1000, render)
-    return None
-
-master.after(0, render)
-master.mainloop()
+
+    def __init__(self, master: tk.Tk, profiler: Optional[TickProfiler] = None,
+                 use_matplotlib: bool = False):
+        self.master = master
+        self.use_matplotlib = use_matplotlib
+        self.profiler = profiler if profiler else TickProfiler("gui", enabled=False)
+        # every cell that changes between refreshes is updated through the
+        # view model so it is only reconfigured when its value changes
+        self.view_model = ViewModel()
+        self.labels = [[tk.Label(master, anchor="e") for column in range(6)]
+                       for row in range(21)]
+        labels = self.labels
+
+        # setting minimum column widths for name columns.  This helps reduce
+        # flickering when a player with a long name is moved on or off the
+        # scoreboard
+        labels[0][0].configure(width=15)
+        labels[0][3].configure(width=15)
+
+        self.rival_labels = [labels[row][3] for row in range(16, 20)]
+        self.rival_elo_labels = [labels[row][4] for row in range(16, 20)]
+        self.rival_class_icons = [labels[row][5] for row in range(16, 20)]
+
+        for row in range(21):
+            for column in range(6):
+                labels[row][column].grid(row=row, column=column,
+                                         sticky=tk.W if column in {2, 5} else tk.E)
+                if headings.get( (row, column)):
+                    labels[row][column].configure(text=headings[(row, column)],
+                                                  font=('Helvetica', 12, 'bold'))
+
+        self.class_tk_imgs: Dict[str, object] = {}
+        # the killstreak, elo and team elo gap charts
+        self.charts: Optional[List[LineChart]] = None
+        # the game of the snapshot shown in the charts
+        self.charted_game: Optional[int] = None
+        self.tk_subplot = None
+        self.canvas = None
+        # the killstreak history is only redrawn when it changes
+        self.plotted_killstreaks: List[int] = [-1]
+
+        self.debug_label = tk.Label(master, anchor="w", font=("Courier", 8))
+        if self.profiler.enabled:
+            self.debug_label.grid(row=23, column=0, columnspan=20, sticky=tk.W)
+
+    def class_image(self, tf2_class: str):
+        """
+        returns the icon of the class, loading it on first use
+        """
+        if tf2_class not in class_icons:
+            tf2_class = "many"
+        img = self.class_tk_imgs.get(tf2_class)
+        if img is None:
+            from PIL import ImageTk, Image # type: ignore #pylint: disable=import-outside-toplevel
+            img = ImageTk.PhotoImage(Image.open(f"tf2_icons/{tf2_class}.png").resize((16,16)))
+            self.class_tk_imgs[tf2_class] = img
+        return img
+
+    def _create_charts(self) -> None:
+        frame = tk.Frame(self.master)
+        frame.grid(row=21, column=0, columnspan=20, rowspan=2, sticky=tk.W, padx=5, pady=5)
+        self.charts = []
+        # the snapshot has the streaks of the last 8 lives and the elo after
+        # the last 50 kills and deaths of the user
+        for title, name, color, points in [("Killstreak History", "streak", "blue", 8),
+                                           ("Elo", "elo", "purple", 50),
+                                           ("Team Elo Gap", "gap", "green", 50)]:
+            canvas = tk.Canvas(frame, width=250, height=150, bg="white",
+                               highlightthickness=0)
+            canvas.pack(side=tk.LEFT)
+            chart = LineChart(canvas, title, width=250, height=150, max_points=points)
+            chart.add_series(name, color)
+            self.charts.append(chart)
+
+    def _create_plot(self) -> None:
+        # matplotlib takes longer to import than everything else, so the
+        # plot is only created when the first killstreak history is drawn
+        import matplotlib # pylint: disable=import-outside-toplevel
+        matplotlib.use("TkAgg")
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg # pylint: disable=import-outside-toplevel
+        from matplotlib.figure import Figure # pylint: disable=import-outside-toplevel
+
+        tkf = Figure(figsize=(5,4), dpi=100)
+        self.tk_subplot = tkf.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(tkf, self.master)
+        self.canvas.get_tk_widget().grid(row=21, column=0, columnspan=20, rowspan=2,
+                   sticky=tk.W+tk.E+tk.N+tk.S, padx=5, pady=5)
+
+    def update_avg_team_elo(self, cells, ally_avg_elo, enemy_avg_elo):
+        view_model = self.view_model
+        ally_fg, enemy_fg = "black", "black"
+        if ally_avg_elo > enemy_avg_elo:
+            ally_fg, enemy_fg = "green", "red"
+        elif ally_avg_elo < enemy_avg_elo:
+            ally_fg, enemy_fg = "red", "green"
+
+        view_model.set(cells[0], text="Team Elo", font=('Helvetica', 12, 'bold'))
+        view_model.set(cells[1], text=ally_avg_elo, fg=ally_fg)
+        view_model.set(cells[3], text="Team Elo", font=('Helvetica', 12, 'bold'))
+        view_model.set(cells[4], text=enemy_avg_elo, fg=enemy_fg)
+
+    def render(self, snapshot: Snapshot) -> int:
+        """
+        Updates the stats in the tkinter gui and returns the number of widgets
+        that changed
+        """
+        profiler = self.profiler
+        profiler.begin_tick()
+        with profiler.stage("render"):
+            changed = self.render_cells(snapshot)
+        with profiler.stage("draw"):
+            if self.use_matplotlib:
+                self.draw_killstreaks(snapshot.killstreak_history)
+            else:
+                self.draw_charts(snapshot)
+        profiler.end_tick()
+        return changed
+
+    def draw_charts(self, snapshot: Snapshot) -> bool:
+        """
+        adds the changes of the histories to the charts.  The team elo gap is
+        not in the snapshot as a history, so a point is added whenever it
+        changes.  Returns True if a chart changed.
+        """
+        if self.charts is None:
+            self._create_charts()
+        if snapshot.game_id != self.charted_game:
+            # the histories and ranges of the last game do not carry over
+            self.clear_charts()
+            self.charted_game = snapshot.game_id
+        streaks, elo, gap = self.charts
+        changed = streaks.set_points("streak", snapshot.killstreak_history)
+        changed |= elo.set_points("elo", snapshot.elo_history)
+        elo_gap = snapshot.ally_elo - snapshot.enemy_elo
+        if gap.values("gap")[-1:] != [elo_gap]:
+            gap.append("gap", elo_gap)
+            changed = True
+        return changed
+
+    def clear_charts(self) -> None:
+        """
+        clears the charts, for example when a replay jumps back
+        """
+        if self.charts:
+            for chart in self.charts:
+                chart.clear()
+        self.plotted_killstreaks[:] = [-1]
+
+    def draw_killstreaks(self, padded_kill_events) -> None:
+        """
+        redraws the killstreak plot if the history changed
+        """
+        if list(padded_kill_events) != self.plotted_killstreaks:
+            self.plotted_killstreaks[:] = padded_kill_events
+            if self.canvas is None:
+                self._create_plot()
+            tk_subplot = self.tk_subplot
+            tk_subplot.clear()
+            tk_subplot.plot(list(range(len(padded_kill_events))),padded_kill_events)
+            tk_subplot.set_ylabel("Kills")
+            tk_subplot.set_xlabel("Life Number")
+            tk_subplot.set_title("Killstreak History")
+            self.canvas.draw()
+
+    def render_cells(self, snapshot: Snapshot) -> int:
+        view_model = self.view_model
+        labels = self.labels
+        class_image = self.class_image
+        view_model.begin_tick()
+        view_model.set(labels[16][1], text=snapshot.kills)
+        view_model.set(labels[17][1], text=snapshot.deaths)
+        view_model.set(labels[18][1], text=snapshot.kd)
+        view_model.set(labels[19][1], text=snapshot.streak)
+        view_model.set(labels[20][1], text=int(snapshot.elo))
+
+        top_player_rows = list(range(2, 8))
+        player_rows = len(top_player_rows)
+
+        # padding info cells with empty data so old data is overwritten
+        ally_info = list(snapshot.allies) + [PlayerRow("", 0, "empty")] * (player_rows - len(snapshot.allies))
+        enemy_info = list(snapshot.enemies) + [PlayerRow("", 0, "empty")] * (player_rows - len(snapshot.enemies))
+        rival_info = list(snapshot.rivals) + [None] * (len(self.rival_labels) - len(snapshot.rivals))
+
+        self.update_avg_team_elo(labels[8], snapshot.ally_elo, snapshot.enemy_elo)
+        view_model.set(labels[9][1], text=snapshot.ally_kills)
+        view_model.set(labels[9][4], text=snapshot.enemy_kills)
+        # the recent stats are over the sliding window of the last minutes
+        view_model.set(labels[9][2], text=f"K/D {snapshot.ally_recent_kd}")
+        view_model.set(labels[9][5], text=f"K/D {snapshot.enemy_recent_kd}")
+        view_model.set(labels[16][2], text=f"{snapshot.kills_per_minute}/min")
+        view_model.set(labels[17][2], text=f"{snapshot.deaths_per_minute}/min")
+        view_model.set(labels[18][2], text=f"recent {snapshot.recent_kd}")
+
+        ally_killtypes = dict(snapshot.ally_killtypes)
+        enemy_killtypes = dict(snapshot.enemy_killtypes)
+        for i, n in zip(range(11, 18), ["explosive","bullet", "fire", "melee"]):
+            view_model.set(labels[i][0], text=n)
+            view_model.set(labels[i][1], text=ally_killtypes[n])
+            view_model.set(labels[i][3], text=n)
+            view_model.set(labels[i][4], text=enemy_killtypes[n])
+
+        for i, (uname, elo, utf2_class) in zip(top_player_rows, ally_info):
+            view_model.set(labels[i][0], text=f"{uname[:20]:>20}")
+            view_model.set(labels[i][1], text=int(elo))
+            view_model.set(labels[i][2], image=class_image(utf2_class))
+
+
+        for i, (uname, elo, utf2_class) in zip(top_player_rows, enemy_info):
+            view_model.set(labels[i][3], text=f"{uname[:20]:>20}")
+            view_model.set(labels[i][4], text=int(elo))
+            view_model.set(labels[i][5], image=class_image(utf2_class))
+
+
+        for rival, rl, rel, rci in zip(rival_info, self.rival_labels, self.rival_elo_labels,
+                                       self.rival_class_icons):
+            if rival is None:
+                view_model.set(rl, text="")
+                view_model.set(rel, text="")
+                view_model.set(rci, image="")
+                continue
+            rname, rdeaths, relo, rclass = rival
+            view_model.set(rl, text=f"{rname[:20]:>20} ({rdeaths})")
+            view_model.set(rel, text=int(relo))
+            view_model.set(rci, image=class_image(rclass))
+        return view_model.end_tick()
+
+    def show_profile(self, profilers: List[TickProfiler]) -> None:
+        """
+        shows the stage timings of the profilers in the debug row
+        """
+        self.debug_label.configure(text="\n".join(p.summary() for p in profilers))
+
+
+class ReplayControls:
+    """
+    A slider and a play button below the dashboard that scrub through a
+    recorded game.  Playing advances `speed` lines every 100 ms.
+    """
+
+    def __init__(self, master: tk.Tk, dashboard: Dashboard, replay, speed: int = 50):
+        self.master = master
+        self.dashboard = dashboard
+        self.replay = replay
+        self.speed = speed
+        self.playing = False
+        self.position = 0
+        self.scale = tk.Scale(master, from_=0, to=len(replay), orient=tk.HORIZONTAL,
+                              showvalue=True, command=self.on_scale)
+        self.scale.grid(row=24, column=0, columnspan=5, sticky=tk.W+tk.E)
+        self.button = tk.Button(master, text="Play", command=self.toggle)
+        self.button.grid(row=24, column=5)
+        self.show(0)
+
+    def show(self, position: int) -> None:
+        # the team elo gap chart is built from the snapshots shown, so it
+        # starts again when the replay goes back
+        if position < self.position:
+            self.dashboard.clear_charts()
+        self.position = position
+        self.dashboard.render(self.replay.snapshot(position))
+
+    def on_scale(self, value: str) -> None:
+        self.show(int(value))
+
+    def toggle(self) -> None:
+        self.playing = not self.playing
+        self.button.configure(text="Pause" if self.playing else "Play")
+        if self.playing:
+            self.master.after(0, self.play)
+
+    def play(self) -> None:
+        if not self.playing:
+            return
+        position = min(len(self.replay), self.scale.get() + self.speed)
+        # setting the scale calls on_scale, which renders the position
+        self.scale.set(position)
+        if position == len(self.replay):
+            self.toggle()
+            return
+        self.master.after(100, self.play)
+
+
+def read_user(user_path: str) -> str:
+    with open(user_path, encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    start = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Team Fortress 2 stats dashboard")
+    parser.add_argument("--log", default=default_log_path, help="path to logs.txt")
+    parser.add_argument("--user", default="tf2_user.txt",
+                        help="file containing the username of the player")
+    # with --profile the stage timings of the worker and the gui are shown
+    # in a debug row and written to tf2_profile.json on exit
+    parser.add_argument("--profile", action="store_true",
+                        help="show stage timings and write tf2_profile.json")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="also serve the stats over local http on the port")
+    parser.add_argument("--replay", type=int, nargs="?", const=-1, metavar="GAME",
+                        help="replay a recorded game, by default the latest one")
+    parser.add_argument("--speed", type=int, default=50,
+                        help="log lines played back every 100 ms in replays")
+    parser.add_argument("--matplotlib", action="store_true",
+                        help="plot the killstreak history with matplotlib")
+    args = parser.parse_args(argv)
+
+    worker_profiler = TickProfiler("worker", enabled=args.profile, budget=0.25)
+    gui_profiler = TickProfiler("gui", enabled=args.profile, budget=0.05)
+
+    weapon_class, weapon_dmg = load_weapons("tf2_weapons.db")
+    master = tk.Tk()
+    master.title("TF2 Dashboard")
+    dashboard = Dashboard(master, gui_profiler, args.matplotlib)
+    if args.replay is not None:
+        from game_replay import GameReplay # pylint: disable=import-outside-toplevel
+        try:
+            replay = GameReplay(args.log, read_user(args.user), weapon_class, weapon_dmg,
+                                game=args.replay)
+        except ValueError as e:
+            master.destroy()
+            parser.exit(1, f"{e}\n")
+        ReplayControls(master, dashboard, replay, args.speed)
+        master.mainloop()
+        return
+
+    server = None
+    if args.serve:
+        from stats_server import StatsServer # pylint: disable=import-outside-toplevel
+        server = StatsServer(port=args.serve)
+        server.start()
+    worker = ComputeWorker(args.log, args.user, weapon_class, weapon_dmg,
+                           ratings=RatingStore("tf2_ratings.db"),
+                           profiler=worker_profiler,
+                           on_snapshot=server.publish if server else None,
+                           event_cache=EventCache("tf2_events.db",
+                                                  weapons_key(weapon_class, weapon_dmg)))
+
+    first_render = [True]
+
+    def poll_snapshots() -> None:
+        """
+        applies the newest snapshot from the compute worker, if there is one
+        """
+        snapshot = worker.latest()
+        if snapshot:
+            dashboard.render(snapshot)
+            if args.profile:
+                if first_render[0]:
+                    print(f"first render {(time.perf_counter() - start) * 1000:.0f} ms "
+                          "after startup")
+                dashboard.show_profile([worker_profiler, gui_profiler])
+            first_render[0] = False
+        master.after(100, poll_snapshots)
+
+    worker.start()
+    master.after(0, poll_snapshots)
+    if args.profile:
+        print(f"window ready {(time.perf_counter() - start) * 1000:.0f} ms after startup")
+    master.mainloop()
+    worker.stop()
+    if server:
+        server.stop()
+    if args.profile:
+        dump_json("tf2_profile.json", [worker_profiler, gui_profiler])
+
+
+if __name__ == "__main__":
+    main()
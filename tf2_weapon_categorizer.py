@@ -1,27 +1,114 @@
+"""
+Adds the weapons found in the tf2 log to the weapon table of tf2_weapons.db.
 
+    python tf2_weapon_categorizer.py                      asks about each new weapon
+    python tf2_weapon_categorizer.py --discover new.csv   lists the new weapons
+    python tf2_weapon_categorizer.py --apply new.csv      adds the classified weapons
+
+The review file written by --discover has a row per unknown weapon with its
+number of kills and a sample line.  Fill in the tf2_class and dmg_type
+columns, then add the weapons with --apply.
+"""
+
+import argparse
+import csv
 import sqlite3
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
-conn = sqlite3.connect("tf2_weapons.db")
-cur = conn.cursor()
+from log_reader import default_log_path
 
-fpath = "C:\\Program Files (x86)\\Steam\\steamapps\\common\\Team Fortress 2\\tf\\logs.txt"
 tf2_class = {"medic", "scout", "spy", "sniper", "heavyweapons", "engineer", "demoman", "pyro", "soldier", "many"}
 dmg_type = {"bullet", "explosive", "fire", "bleed", "melee", "critical", "fall", "crush", "drowning"}
 
-def weapon_in_db(weapon):
-    cur.execute("select * from weapon where name=:name", {"name": weapon})
-    return cur.fetchone()
+review_columns = ["weapon", "kills", "tf2_class", "dmg_type", "sample"]
 
-with open(fpath, errors="ignore") as f:
-    for i, line in enumerate(f):
-        if "killed" not in line:
-            continue
-        if not line.strip().endswith(".") and not line.strip().endswith(". (crit)"):
+
+def known_weapons(conn: sqlite3.Connection) -> Set[str]:
+    """
+    returns the names of the weapons in the weapon table
+    """
+    return {name for name, in conn.execute("select name from weapon")}
+
+
+def kill_weapons(path: str) -> Iterator[Tuple[int, bytes, bytes]]:
+    """
+    yields the line number, weapon and line of every kill line in the log
+    """
+    with open(path, "rb") as f:
+        for i, line in enumerate(f):
+            if b"killed" not in line:
+                continue
+            line = line.strip()
+            if not line.endswith(b".") and not line.endswith(b". (crit)"):
+                continue
+            tokens = line.split()
+            if len(tokens) < 2:
+                continue
+            one, two = tokens[-2:]
+            yield (i, two if two != b"(crit)" else one, line)
+
+
+def discover(path: str, known: Set[str]) -> List[Tuple[str, int, str]]:
+    """
+    returns the unknown weapons in the log with their number of kills and a
+    sample line, the most used first
+    """
+    counts: Counter = Counter()
+    samples: Dict[bytes, bytes] = {}
+    known_bytes = {w.encode() for w in known}
+    for _, weapon, line in kill_weapons(path):
+        if weapon in known_bytes:
             continue
-        one, two = line.split()[-2:]
-        weapon = two if two != "(crit)" else one
-        
-        if weapon_in_db(weapon):
+        counts[weapon] += 1
+        samples.setdefault(weapon, line)
+    return [(w.decode(errors="ignore"), n, samples[w].decode(errors="ignore"))
+            for w, n in counts.most_common()]
+
+
+def write_review(review_path: str, weapons: List[Tuple[str, int, str]]) -> None:
+    with open(review_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(review_columns)
+        for weapon, kills, sample in weapons:
+            writer.writerow([weapon, kills, "", "", sample])
+
+
+def apply_review(conn: sqlite3.Connection, review_path: str) -> int:
+    """
+    adds the classified weapons of the review file in one transaction and
+    returns the number of weapons added.  Rows without a class and damage
+    type are skipped.
+    """
+    rows = []
+    with open(review_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            wc = row["tf2_class"].strip()
+            wt = row["dmg_type"].strip()
+            if not wc and not wt:
+                continue
+            if wc not in tf2_class:
+                print(row["weapon"], "invalid class", wc)
+                continue
+            if wt not in dmg_type:
+                print(row["weapon"], "invalid dmg type", wt)
+                continue
+            rows.append({"name": row["weapon"], "tf2_class": wc, "dmg_type": wt})
+
+    with conn:
+        conn.executemany("insert or replace into weapon values (:name, :tf2_class, :dmg_type)",
+                         rows)
+    return len(rows)
+
+
+def categorize(conn: sqlite3.Connection, path: str) -> None:
+    """
+    asks for the class and damage type of each new weapon in the log
+    """
+    known = known_weapons(conn)
+    for i, weapon_bytes, _ in kill_weapons(path):
+        weapon = weapon_bytes.decode(errors="ignore")
+        if weapon in known:
             continue
 
         print(i, weapon)
@@ -30,7 +117,7 @@ with open(fpath, errors="ignore") as f:
             print("invalid class")
             continue
 
-        
+
         wt = input("  type: ").strip()
         if wt not in dmg_type:
             print("invalid dmg type")
@@ -41,11 +128,35 @@ with open(fpath, errors="ignore") as f:
                 "dmg_type": wt
             }
 
-        cur.execute("insert into weapon values (:name, :tf2_class, :dmg_type)", info)
+        conn.execute("insert into weapon values (:name, :tf2_class, :dmg_type)", info)
         conn.commit()
-conn.close()
-            
+        known.add(weapon)
+
 
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--log", default=default_log_path, help="path to logs.txt")
+    parser.add_argument("--db", default="tf2_weapons.db", help="weapon database")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--discover", metavar="REVIEW_CSV",
+                      help="write the unknown weapons to a review file")
+    mode.add_argument("--apply", metavar="REVIEW_CSV",
+                      help="add the weapons classified in a review file")
+    args = parser.parse_args(argv)
 
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.discover:
+            weapons = discover(args.log, known_weapons(conn))
+            write_review(args.discover, weapons)
+            print(f"{len(weapons)} unknown weapons written to {args.discover}")
+        elif args.apply:
+            print(f"{apply_review(conn, args.apply)} weapons added")
+        else:
+            categorize(conn, args.log)
+    finally:
+        conn.close()
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Times the stages of every refresh tick and keeps rolling percentiles of the
+timings, so a slow dashboard can be traced to the stage that is to blame.
+"""
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Deque, Dict, Iterator, List, Optional, Sequence
+
+# the stage context used when profiling is disabled
+_null_stage = nullcontext()
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    returns the nearest rank q-th percentile of the sorted values
+    """
+    if not values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(values)) - 1
+    return values[max(0, min(len(values) - 1, rank))]
+
+
+class TickProfiler:
+    """
+    Collects the time spent in each named stage of a tick.  The last
+    `window` timings of every stage and of whole ticks are kept, and a
+    breakdown is printed when a tick takes longer than `budget` seconds.
+
+    When disabled, stage() returns a shared no-op context and the tick
+    methods return immediately, so the instrumentation can stay in place.
+    """
+
+    def __init__(self, name: str, enabled: bool = True, budget: float = 0.1,
+                 window: int = 500):
+        self.name = name
+        self.enabled = enabled
+        self.budget = budget
+        self.window = window
+        self.slow_ticks = 0
+        self._timings: Dict[str, Deque[float]] = {}
+        self._tick: Dict[str, float] = {}
+        self._tick_start = 0.0
+        # the stats are read from other threads than the profiled one
+        self._lock = threading.Lock()
+
+    def begin_tick(self) -> None:
+        if not self.enabled:
+            return
+        self._tick = {}
+        self._tick_start = time.perf_counter()
+
+    def stage(self, stage: str):
+        """
+        returns a context that adds the time spent in it to the stage
+        """
+        if not self.enabled:
+            return _null_stage
+        return self._time_stage(stage)
+
+    @contextmanager
+    def _time_stage(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._tick[stage] = self._tick.get(stage, 0.0) + time.perf_counter() - start
+
+    def end_tick(self) -> Optional[float]:
+        """
+        records the timings of the tick and returns its duration in seconds
+        """
+        if not self.enabled:
+            return None
+        total = time.perf_counter() - self._tick_start
+        with self._lock:
+            for stage, seconds in self._tick.items():
+                self._record(stage, seconds)
+            self._record("tick", total)
+        if total > self.budget:
+            self.slow_ticks += 1
+            breakdown = ", ".join(f"{stage} {seconds * 1000:.1f} ms"
+                                  for stage, seconds in self._tick.items())
+            print(f"slow {self.name} tick {total * 1000:.1f} ms: {breakdown}")
+        return total
+
+    def _record(self, stage: str, seconds: float) -> None:
+        timings = self._timings.get(stage)
+        if timings is None:
+            timings = self._timings[stage] = deque(maxlen=self.window)
+        timings.append(seconds)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        returns the p50, p95 and max milliseconds of every stage
+        """
+        with self._lock:
+            timings = {stage: sorted(t) for stage, t in self._timings.items()}
+        return {stage: {"p50": round(percentile(t, 50) * 1000, 3),
+                        "p95": round(percentile(t, 95) * 1000, 3),
+                        "max": round(t[-1] * 1000, 3),
+                        "count": len(t)}
+                for stage, t in timings.items()}
+
+    def summary(self) -> str:
+        """
+        returns a one line summary of the stats for the debug row
+        """
+        stats = self.stats()
+        return f"{self.name}: " + "  ".join(
+            f"{stage} {s['p50']:.1f}/{s['p95']:.1f}/{s['max']:.1f}"
+            for stage, s in stats.items())
+
+
+def dump_json(path: str, profilers: List[TickProfiler]) -> None:
+    """
+    writes the stats of the profilers to a json file
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({p.name: {"stages": p.stats(), "slow_ticks": p.slow_ticks,
+                            "budget_ms": p.budget * 1000}
+                   for p in profilers}, f, indent=2)
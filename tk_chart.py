@@ -0,0 +1,192 @@
+"""
+Line charts drawn on a plain tkinter canvas.  Each line segment is its own
+canvas item, so adding a point creates one item instead of redrawing the
+chart, and the segments already drawn are moved or scaled by tk when the
+window slides along or the value range grows.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class ChartSeries:
+    """
+    The values of one line of a chart and the ids of its segment items.
+    items[i] is the segment from point i to point i + 1.
+    """
+
+    def __init__(self, name: str, color: str):
+        self.name = name
+        self.color = color
+        self.tag = f"series-{name}"
+        self.values: List[float] = []
+        self.items: List[int] = []
+
+
+def overlap(old: Sequence[float], new: Sequence[float]) -> Optional[int]:
+    """
+    returns the smallest number of points to drop from the start of old so
+    that the rest of old, except its last point, starts new.  The last point
+    may differ because the newest point of a history can still change, like
+    the streak of the current life.  Returns None if no points can be kept.
+    """
+    for shift in range(len(old)):
+        kept = len(old) - shift
+        if kept <= len(new) and old[shift:-1] == new[:kept - 1]:
+            return shift
+    return None
+
+
+class LineChart:
+    """
+    A chart of the last `max_points` values of each series, on a canvas of
+    the given size.  Updates cost a fixed number of canvas calls however
+    long the series are:
+
+    * append creates one segment, and when the series is full deletes its
+      oldest segment and moves the rest one step to the left
+    * a value outside the range grows the range by a quarter more than
+      needed, and rescales every segment with one canvas call
+    * set_points only draws the difference to the values already drawn
+
+    The range never shrinks until the chart is cleared.
+    """
+
+    def __init__(self, canvas, title: str = "", width: int = 250, height: int = 150,
+                 max_points: int = 50):
+        self.canvas = canvas
+        self.max_points = max_points
+        self.left = 40
+        self.right = width - 8
+        self.top = 22
+        self.bottom = height - 8
+        self.dx = (self.right - self.left) / (max_points - 1)
+        self.low: Optional[float] = None
+        self.high: Optional[float] = None
+        self.series: Dict[str, ChartSeries] = {}
+
+        canvas.create_text(width / 2, 4, text=title, anchor="n")
+        canvas.create_line(self.left, self.top, self.left, self.bottom, fill="gray")
+        canvas.create_line(self.left, self.bottom, self.right, self.bottom, fill="gray")
+        self.high_label = canvas.create_text(self.left - 4, self.top, text="", anchor="e")
+        self.low_label = canvas.create_text(self.left - 4, self.bottom, text="", anchor="e")
+
+    def add_series(self, name: str, color: str = "blue") -> None:
+        """
+        adds an empty series drawn in the color
+        """
+        self.series[name] = ChartSeries(name, color)
+
+    def values(self, name: str) -> List[float]:
+        """
+        returns the values of the series that are drawn
+        """
+        return self.series[name].values
+
+    def _scale(self) -> float:
+        return (self.bottom - self.top) / (self.high - self.low)
+
+    def point(self, index: int, value: float) -> Tuple[float, float]:
+        """
+        returns the canvas coordinates of the value at the index of a series
+        """
+        return (self.left + index * self.dx,
+                self.bottom - (value - self.low) * self._scale())
+
+    def _fit(self, value: float) -> None:
+        """
+        grows the range to include the value and moves the drawn segments to
+        the new range
+        """
+        if self.low is None:
+            self.low, self.high = value - 1, value + 1
+        elif self.low <= value <= self.high:
+            return
+        else:
+            low = min(self.low, value)
+            high = max(self.high, value)
+            margin = (high - low) / 4
+            low = low - margin if low < self.low else low
+            high = high + margin if high > self.high else high
+            old_scale = self._scale()
+            old_low = self.low
+            self.low, self.high = low, high
+            scale = self._scale()
+            # y = bottom - (value - low) * scale, so the old coordinates are
+            # scaled around the bottom and then moved by the change of low
+            self.canvas.scale("data", 0, self.bottom, 1, scale / old_scale)
+            self.canvas.move("data", 0, (low - old_low) * scale)
+        self.canvas.itemconfigure(self.high_label, text=f"{self.high:.0f}")
+        self.canvas.itemconfigure(self.low_label, text=f"{self.low:.0f}")
+
+    def append(self, name: str, value: float) -> None:
+        """
+        adds a point to the end of the series
+        """
+        series = self.series[name]
+        self._fit(value)
+        if len(series.values) >= self.max_points:
+            self._shift(series, 1)
+        values = series.values
+        if values:
+            n = len(values)
+            series.items.append(self.canvas.create_line(
+                *self.point(n - 1, values[-1]), *self.point(n, value),
+                fill=series.color, width=2, tags=("data", series.tag)))
+        values.append(value)
+
+    def _shift(self, series: ChartSeries, count: int) -> None:
+        """
+        drops the first count points of the series
+        """
+        for item in series.items[:count]:
+            self.canvas.delete(item)
+        del series.items[:count]
+        del series.values[:count]
+        self.canvas.move(series.tag, -count * self.dx, 0)
+
+    def _set_last(self, series: ChartSeries, value: float) -> None:
+        self._fit(value)
+        values = series.values
+        values[-1] = value
+        if series.items:
+            n = len(values)
+            self.canvas.coords(series.items[-1],
+                               *self.point(n - 2, values[-2]), *self.point(n - 1, value))
+
+    def set_points(self, name: str, values: Sequence[float]) -> bool:
+        """
+        shows the last max_points values in the series.  Histories usually
+        only grew or slid along since they were last shown, so the points
+        that are still shown are kept.  Returns True if the chart changed.
+        """
+        series = self.series[name]
+        values = list(values[-self.max_points:])
+        if values == series.values:
+            return False
+        shift = overlap(series.values, values)
+        if shift is None:
+            self.clear(name)
+            shift = 0
+        elif shift:
+            self._shift(series, shift)
+        kept = len(series.values)
+        if kept and series.values[-1] != values[kept - 1]:
+            self._set_last(series, values[kept - 1])
+        for value in values[kept:]:
+            self.append(name, value)
+        return True
+
+    def clear(self, name: Optional[str] = None) -> None:
+        """
+        removes the points of the series, or of every series and the range
+        if no series is given
+        """
+        cleared = [self.series[name]] if name else list(self.series.values())
+        for series in cleared:
+            self.canvas.delete(series.tag)
+            series.values.clear()
+            series.items.clear()
+        if name is None:
+            self.low = self.high = None
+            self.canvas.itemconfigure(self.high_label, text="")
+            self.canvas.itemconfigure(self.low_label, text="")
@@ -0,0 +1,61 @@
+"""
+Keeps the last value shown in each dashboard cell so widgets are only
+reconfigured when what they show changes.
+"""
+
+from typing import Any, Dict, List
+
+
+class ViewModel:
+    """
+    Remembers the options last applied to each widget.  set only calls
+    configure with the options whose value changed, which avoids the tk
+    relayout and flicker of reconfiguring every cell on every tick.
+
+    The number of widget updates made between begin_tick and end_tick is
+    kept in `tick_updates` for instrumentation.
+    """
+
+    def __init__(self, history: int = 100):
+        self._applied: Dict[Any, Dict[str, Any]] = {}
+        self.updates = 0
+        self.tick_updates: List[int] = []
+        self.history = history
+        self._tick_start = 0
+
+    def set(self, widget, **options) -> bool:
+        """
+        configures the options of the widget that differ from the last
+        applied ones.  Returns True if the widget was updated.
+        """
+        applied = self._applied.setdefault(widget, {})
+        changed = {k: v for k, v in options.items()
+                   if k not in applied or applied[k] != v}
+        if not changed:
+            return False
+        widget.configure(**changed)
+        applied.update(changed)
+        self.updates += 1
+        return True
+
+    def forget(self, widget) -> None:
+        """
+        forgets the applied options of a widget, for example after it was
+        configured outside of the view model
+        """
+        self._applied.pop(widget, None)
+
+    def begin_tick(self) -> None:
+        """
+        starts counting the widget updates of a refresh
+        """
+        self._tick_start = self.updates
+
+    def end_tick(self) -> int:
+        """
+        returns the number of widget updates since begin_tick and records it
+        """
+        count = self.updates - self._tick_start
+        self.tick_updates.append(count)
+        del self.tick_updates[:-self.history]
+        return count
@@ -0,0 +1,34 @@
+"""
+Reads the weapon metadata from the weapon table of tf2_weapons.db.
+"""
+
+import hashlib
+import json
+import sqlite3
+from typing import Dict, Tuple
+
+
+def load_weapons(db_path: str = "tf2_weapons.db") -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    returns dictionaries mapping each weapon to its tf2 class and to its
+    damage type
+    """
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    q: str = "select name, tf2_class, damage_type from weapon"
+    weapon_class = {}
+    weapon_dmg = {}
+    for name, tf2_class, damage_type in cur.execute(q):
+        weapon_class[name] = tf2_class
+        weapon_dmg[name] = damage_type
+    conn.close()
+    return (weapon_class, weapon_dmg)
+
+
+def weapons_key(weapon_class: Dict[str, str], weapon_dmg: Dict[str, str]) -> str:
+    """
+    returns a hash of the weapon tables, which changes when a weapon is
+    added or reclassified
+    """
+    data = json.dumps([sorted(weapon_class.items()), sorted(weapon_dmg.items())])
+    return hashlib.sha1(data.encode()).hexdigest()